@@ -1,37 +1,72 @@
-from typing import List, Optional, Any
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import List, Optional, Any, AsyncIterator, Callable, Union
 from pydantic import BaseModel
-import os
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain.tools import tool
-from sqlalchemy.orm import Session
 from datetime import datetime
+from config import SessionLocal
 from tools.ticket_parser import find_tickets
+from ai.router import ModelRouter, ModelUnavailableError
+from tools.fare_analytics import analyze_fares
+from tools.fare_calendar import find_fare_calendar
+from tools.hotel_parser import find_hotels
+from tools.activity_parser import find_activities
 
 load_dotenv()
 
-global_db = None
-global_roadmap_id = None
+# Roadmap of the current turn; a contextvar so concurrent turns never see each other's,
+# langchain copies it into the executor threads that run the tools
+_turn_roadmap_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("turn_roadmap_id", default=None)
+
+@contextmanager
+def tool_session():
+    # Tools run in executor threads and may outlive a timed-out turn, so they never share the route's Session
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
 
 @tool
 def find_tickets_tool(departure_id: str, destination_id: str, start_date: str, end_date: str) -> Any:
     """Find tickets for a given departure and destination and dates and saves them to the database. departure_id and destination_id are IATA codes. start_date and end_date are dates in the format YYYY-MM-DD"""
-    return find_tickets(global_db, global_roadmap_id, departure_id, destination_id, start_date, end_date)
+    with tool_session() as db:
+        return find_tickets(db, _turn_roadmap_id.get(), departure_id, destination_id, start_date, end_date)
+
+@tool
+def find_fare_calendar_tool(departure_id: str, destination_id: str, start_date: str, end_date: str, window_days: int = 3, fixed_duration: bool = True) -> Any:
+    """Finds the cheapest travel dates around the given ones in a single call. Searches outbound dates start_date±window_days and return dates end_date±window_days (window_days at most 3) and returns a price matrix and the cheapest date combinations. By default the trip length is kept; set fixed_duration=False to also vary it. Only a limited number of new date pairs is searched per call, the rest are listed in skipped_pairs. departure_id and destination_id are IATA codes, dates are YYYY-MM-DD. Use it for flexible-date questions instead of calling find_tickets_tool repeatedly."""
+    return find_fare_calendar(departure_id, destination_id, start_date, end_date, window_days=window_days, fixed_duration=fixed_duration)
 
 @tool
-def find_hotels_tool(destination: str, check_in_date: str, check_out_date: str, preference: str) -> str:
-    """Find hotels for a given destination, date range, and preference. Logs to terminal when called."""
-    print(f"[TOOL] find_hotels_tool called with: roadmap_id={global_roadmap_id}, destination={destination}, check_in_date={check_in_date}, check_out_date={check_out_date}, preference={preference}")
-    return f"Hotel found in {destination} ({preference}) from {check_in_date} to {check_out_date}."
+def analyze_fares_tool(max_stops: Optional[int] = None, airline: Optional[str] = None) -> Any:
+    """Analyzes the flight offers from the latest ticket search without searching again: cheapest offer, price distribution, cheapest by airline, stop counts and price/duration trade-offs. Use max_stops=0 for nonstop flights and airline to restrict to one airline name."""
+    return analyze_fares(_turn_roadmap_id.get(), max_stops=max_stops, airline=airline)
 
 @tool
-def find_activities_tool(destination: str, interests: list) -> str:
-    """Find activities for a given destination and list of interests. Logs to terminal when called."""
-    print(f"[TOOL] find_activities_tool called with: roadmap_id={global_roadmap_id}, destination={destination}, interests={interests}")
-    return f"Activities found in {destination} for interests: {', '.join(interests)}."
+def find_hotels_tool(destination: str, check_in_date: str, check_out_date: str, preference: str, near_places: Optional[List[str]] = None, radius_km: float = 3.0, max_price_per_night: Optional[int] = None) -> Any:
+    """Find hotels for a given destination and date range and save the best one to the database. preference is a hotel type (luxury, boutique, standard, hostel, apartment, resort) or "budget". near_places are landmark names (or "lat,lon") the hotel should be within radius_km of. max_price_per_night is in KZT. Dates are YYYY-MM-DD."""
+    with tool_session() as db:
+        return find_hotels(db, _turn_roadmap_id.get(), destination, check_in_date, check_out_date, preference, near_places=near_places, radius_km=radius_km, max_price_per_night=max_price_per_night)
+
+@tool
+def find_activities_tool(destination: str, interests: list, food_types: Optional[List[str]] = None, daily_budget: Optional[int] = None) -> Any:
+    """Find the best activities and food places for a given destination and list of interests and save them to the roadmap. food_types are cuisines (e.g. kazakh, italian, vegan) and daily_budget is in KZT; when omitted, the user's saved preferences are used."""
+    with tool_session() as db:
+        return find_activities(db, _turn_roadmap_id.get(), destination, interests, food_types=food_types, daily_budget=daily_budget)
+
+UNAVAILABLE_REPLY = "Sorry, I'm having trouble reaching the travel assistant right now. Please try again in a moment."
+
+class AssistantUnavailableError(Exception):
+    """The turn hit its deadline or every model's circuit breaker was open."""
+    def __init__(self, usage: Optional[dict] = None):
+        super().__init__(UNAVAILABLE_REPLY)
+        self.usage = usage
 
 class Message(BaseModel):
     role: str
@@ -44,14 +79,12 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     tool_output: Optional[Any] = None
+    usage: Optional[dict] = None
 
 class AIAgent:
     def __init__(self):
-        self.llm = ChatGroq(
-            model="meta-llama/llama-4-maverick-17b-128e-instruct",
-            temperature=0.7,
-            groq_api_key=os.environ.get("GROQ_API_KEY"),
-        )
+        # Primary model with deadline, hedging, fallback models and circuit breakers (see ai/router.py)
+        self.llm = ModelRouter.from_env()
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a friendly and helpful travel planning assistant.\nYour goal is to help the user plan a trip by gathering their preferences step-by-step.\n\nAs soon as you have all the information needed for a planning step (like travel dates, hotel preferences, or interests), IMMEDIATELY use the appropriate tool. Do not wait for further user input if you can proceed.\n\nAfter using a tool, confirm with the user and ask for the next missing piece of information.\n\nIf you do not have enough information for a tool, ask the user a clear, specific question to get it.\n\nAlways be friendly and conversational.\n\nExample:\nUser: I want to go to Paris from July 10 to July 15.\nThought: I have the destination and dates. I should find tickets.\nAction: find_tickets_tool(destination='Paris', start_date='2024-07-10', end_date='2024-07-15')\nObservation: Tickets found for Paris from 2024-07-10 to 2024-07-15.\nFinal Answer: I found tickets for Paris from July 10 to July 15! Would you like to look for hotels next?\n\nBased on the user's request, you can:\n1.  Ask for clarifying information if you don't have enough details (e.g., travel dates, hotel preferences, interests).\n2.  Use the available tools if you have all the necessary information for a planning step.\n\nAfter a tool is used successfully, confirm with the user and ask what they'd like to do next. YOU HAVE TO USE TOOLS IF IT IS NEEDED (WHEN SEARCHING FOR TICKETS/HOTLES/FOOD/ACTIVITY). YOU SHOULD CALL 1 TOOL AT A MESSAGE"""),
             ("placeholder", "{chat_history}"),
@@ -59,28 +92,29 @@ class AIAgent:
             ("placeholder", "{agent_scratchpad}"),
         ])
 
-    async def chat(self, request: ChatRequest, db: Session) -> ChatResponse:
-        global global_db, global_roadmap_id
-        global_db = db
-        global_roadmap_id = request.roadmap_id
-        tools = [find_tickets_tool, find_hotels_tool, find_activities_tool]
+    def _prepare(self, request: ChatRequest):
+        _turn_roadmap_id.set(request.roadmap_id)
+        tools = [find_tickets_tool, find_fare_calendar_tool, analyze_fares_tool, find_hotels_tool, find_activities_tool]
         agent = create_tool_calling_agent(self.llm, tools, self.prompt)
         agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, return_intermediate_steps=True)
         chat_history = []
         for msg in request.messages[:-1]:
             chat_history.append(HumanMessage(content=msg.content) if msg.role == "user" else AIMessage(content=msg.content))
         user_input = request.messages[-1].content
-        response = await agent_executor.ainvoke({
+        return agent_executor, {
             "input": user_input,
             "chat_history": chat_history,
-        })
+        }
+
+    def _build_response(self, response: dict) -> ChatResponse:
         tool_output = None
         for step in response.get('intermediate_steps', []):
             if isinstance(step, tuple) and len(step) == 2:
                 action, observation = step
+                # Structured results only; error and "nothing found" strings stay in the agent's reply
                 if isinstance(observation, list) and observation and isinstance(observation[0], dict):
                     tool_output = observation
-                elif isinstance(observation, str) and action.tool in ["find_tickets_tool", "find_hotels_tool", "find_activities_tool"]:
+                elif isinstance(observation, dict) and observation:
                     tool_output = observation
         reply = response.get("output", "I'm not sure how to respond to that.")
         # If tool_output contains segments with both outbound and return, prepend a summary
@@ -89,4 +123,65 @@ class AIAgent:
             has_return = any(any(seg.get('direction') == 'return' for seg in f['segments']) for f in tool_output)
             if has_outbound and has_return:
                 reply = 'Here are your outbound and return flight options. ' + reply
-        return ChatResponse(response=reply, tool_output=tool_output)
\ No newline at end of file
+        return ChatResponse(response=reply, tool_output=tool_output)
+
+    async def chat(self, request: ChatRequest, on_usage: Optional[Callable[[dict], None]] = None) -> ChatResponse:
+        """
+        Raises AssistantUnavailableError instead of answering with UNAVAILABLE_REPLY, so callers don't store it.
+        on_usage gets the turn's token usage once the turn ends, whether it succeeded, failed or was cancelled.
+        """
+        agent_executor, inputs = self._prepare(request)
+        turn = self.llm.turn()
+        try:
+            async with turn:
+                response = await agent_executor.ainvoke(inputs)
+        except (TimeoutError, ModelUnavailableError) as e:
+            raise AssistantUnavailableError(turn.usage.to_dict()) from e
+        finally:
+            if on_usage:
+                on_usage(turn.usage.to_dict())
+        return self._build_response(response).model_copy(update={"usage": turn.usage.to_dict()})
+
+    async def stream_chat(self, request: ChatRequest, on_usage: Optional[Callable[[dict], None]] = None) -> AsyncIterator[Union[str, ChatResponse]]:
+        """
+        Yields the model's text chunks as they are generated, then the final ChatResponse (UNAVAILABLE_REPLY on timeout).
+        on_usage is called as in chat(), also when the consumer stops early.
+        """
+        agent_executor, inputs = self._prepare(request)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run():
+            # The turn deadline bounds the agent run in this task, not the consumer's awaits between chunks
+            response = None
+            turn = self.llm.turn()
+            try:
+                async with turn:
+                    async for event in agent_executor.astream_events(inputs, version="v2"):
+                        if event["event"] == "on_chat_model_stream":
+                            content = event["data"]["chunk"].content
+                            if isinstance(content, str) and content:
+                                queue.put_nowait(content)
+                        elif event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                            response = event["data"].get("output")
+            except (TimeoutError, ModelUnavailableError):
+                queue.put_nowait(ChatResponse(response=UNAVAILABLE_REPLY, usage=turn.usage.to_dict()))
+                return
+            except Exception as e:
+                queue.put_nowait(e)
+                return
+            finally:
+                if on_usage:
+                    on_usage(turn.usage.to_dict())
+            queue.put_nowait(self._build_response(response if isinstance(response, dict) else {}).model_copy(update={"usage": turn.usage.to_dict()}))
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                if isinstance(item, ChatResponse):
+                    return
+        finally:
+            task.cancel()
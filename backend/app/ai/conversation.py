@@ -1,10 +1,22 @@
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
-from schemas.models import ChatConversation, ChatMessage, UserInDB
+from schemas.models import ChatConversation, ChatMessage, UserInDB, ToolOutput
 from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+import hashlib
+import json
 import uuid
 
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2"
+
+def _html_escape(column):
+    # Headlines are HTML: escape message text in SQL so the only markup left is ts_headline's <mark>
+    for char, entity in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#39;")):
+        column = func.replace(column, char, entity)
+    return column
+
 class Conversation(BaseModel):
     id: str = Field(..., description="Unique conversation ID")
     messages: List[Dict] = Field(default_factory=list, description="List of messages in the conversation")
@@ -28,29 +40,110 @@ class ConversationManager:
         except ValueError:
             return None
 
-    def add_message(self, db: Session, user: UserInDB, conversation_id: str, role: str, content: str):
+    def save_tool_output(self, db: Session, data: Any) -> Optional[int]:
+        """Stores structured tool output once per distinct content and returns its id."""
+        if not isinstance(data, (list, dict)) or not data:
+            return None
+        content_hash = hashlib.sha256(json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode()).hexdigest()
+        db.execute(
+            insert(ToolOutput)
+            .values(content_hash=content_hash, data=data, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=[ToolOutput.content_hash])
+        )
+        return db.query(ToolOutput.id).filter(ToolOutput.content_hash == content_hash).scalar()
+
+    def get_tool_output(self, db: Session, user: UserInDB, tool_output_id: int) -> Optional[ToolOutput]:
+        # Only visible through one of the user's own messages
+        return (
+            db.query(ToolOutput)
+            .join(ChatMessage, ChatMessage.tool_output_id == ToolOutput.id)
+            .join(ChatConversation, ChatConversation.id == ChatMessage.conversation_id)
+            .filter(ToolOutput.id == tool_output_id, ChatConversation.user_id == user.id)
+            .first()
+        )
+
+    def add_message(self, db: Session, user: UserInDB, conversation_id: str, role: str, content: str, tool_output: Any = None):
         conversation = self.get_conversation(db, user, conversation_id)
         if not conversation:
             conversation = self.create_conversation(db, user, conversation_id=conversation_id)
         
-        message = ChatMessage(conversation_id=conversation.id, role=role, content=content)
+        message = ChatMessage(
+            conversation_id=conversation.id,
+            role=role,
+            content=content,
+            tool_output_id=self.save_tool_output(db, tool_output),
+        )
         db.add(message)
         db.commit()
         db.refresh(message)
         return message
 
+    def append_messages(self, db: Session, conversation_id: uuid.UUID, messages: List[Dict]) -> List[ChatMessage]:
+        """Adds messages to a conversation that is already known to exist, in a single transaction."""
+        rows = [
+            ChatMessage(
+                conversation_id=conversation_id,
+                role=m["role"],
+                content=m["content"],
+                timestamp=m.get("timestamp"),
+                tool_output_id=self.save_tool_output(db, m.get("tool_output")),
+            )
+            for m in messages
+        ]
+        db.add_all(rows)
+        db.commit()
+        return rows
+
     def get_context(self, db: Session, user: UserInDB, conversation_id: str, max_messages: int = 10) -> List[Dict]:
         conversation = self.get_conversation(db, user, conversation_id)
         if not conversation:
             return []
         
-        messages = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation.id).order_by(ChatMessage.timestamp).all()
+        messages = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation.id).order_by(ChatMessage.timestamp, ChatMessage.id).all()
         recent_messages = messages[-max_messages:]
         return [{"role": m.role, "content": m.content} for m in recent_messages]
 
     def get_user_conversations(self, db: Session, user: UserInDB) -> List[ChatConversation]:
         return db.query(ChatConversation).filter(ChatConversation.user_id == user.id).all()
 
+    def search_messages(self, db: Session, user: UserInDB, query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        ts_query = func.websearch_to_tsquery("english", query)
+        rank = func.ts_rank_cd(ChatMessage.content_tsv, ts_query)
+        # Rank and paginate on the GIN index first, so ts_headline only runs for the returned page
+        page = (
+            db.query(ChatMessage.id.label("id"), rank.label("rank"))
+            .join(ChatConversation, ChatConversation.id == ChatMessage.conversation_id)
+            .filter(ChatConversation.user_id == user.id, ChatMessage.content_tsv.op("@@")(ts_query))
+            .order_by(rank.desc(), ChatMessage.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .subquery()
+        )
+        rows = (
+            db.query(
+                ChatMessage.id,
+                ChatMessage.conversation_id,
+                ChatMessage.role,
+                ChatMessage.timestamp,
+                page.c.rank,
+                func.ts_headline("english", _html_escape(ChatMessage.content), ts_query, SEARCH_HEADLINE_OPTIONS).label("headline"),
+            )
+            .join(page, page.c.id == ChatMessage.id)
+            .order_by(page.c.rank.desc(), ChatMessage.id.desc())
+            .all()
+        )
+        return [
+            {
+                "message_id": r.id,
+                "conversation_id": r.conversation_id,
+                "role": r.role,
+                "headline": r.headline,
+                "rank": r.rank,
+                "timestamp": r.timestamp,
+            }
+            for r in rows
+        ]
+
     def update_context(self, conversation_id: str, context: Dict):
         # This method is not used in the chat flow, but left for completeness.
         # It might need a db session if it were to be used.
@@ -0,0 +1,256 @@
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from typing import Any, List, Optional, Sequence, Tuple
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+LLM_PRIMARY_MODEL = os.environ.get("LLM_PRIMARY_MODEL", "meta-llama/llama-4-maverick-17b-128e-instruct")
+LLM_FALLBACK_MODELS = [m.strip() for m in os.environ.get("LLM_FALLBACK_MODELS", "llama-3.3-70b-versatile,llama-3.1-8b-instant").split(",") if m.strip()]
+LLM_TURN_DEADLINE_SECONDS = float(os.environ.get("LLM_TURN_DEADLINE_SECONDS", 60))
+LLM_CALL_TIMEOUT_SECONDS = float(os.environ.get("LLM_CALL_TIMEOUT_SECONDS", 30))
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "1") == "1"
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("LLM_HEDGE_MIN_DELAY_SECONDS", 1.0))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", 3))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get("LLM_BREAKER_RESET_SECONDS", 30))
+
+# Absolute monotonic deadline and token usage of the current chat turn, set by ModelRouter.turn()
+_turn_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("turn_deadline", default=None)
+_turn_usage: contextvars.ContextVar[Optional["TurnUsage"]] = contextvars.ContextVar("turn_usage", default=None)
+
+class ModelUnavailableError(Exception):
+    pass
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout` seconds,
+    then lets a single trial call through (half-open); its outcome closes or re-opens the breaker.
+    """
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET_SECONDS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+
+class LatencyTracker:
+    def __init__(self, window: int = 100, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+class TurnUsage:
+    """Token usage summed over every LLM call of one chat turn."""
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+
+    def add(self, usage_metadata: Optional[dict]):
+        self.calls += 1
+        if usage_metadata:
+            self.prompt_tokens += usage_metadata.get("input_tokens", 0)
+            self.completion_tokens += usage_metadata.get("output_tokens", 0)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "llm_calls": self.calls,
+        }
+
+class ModelRoute:
+    def __init__(self, name: str, model: Any, breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+
+class ModelRouter:
+    """
+    Chat model facade for create_tool_calling_agent. Every LLM call goes to the first route whose
+    circuit breaker is closed, is bounded by the turn deadline, is hedged with a duplicate request once
+    it runs longer than the route's p95 latency, and falls back to the next route when it fails.
+    Hedged duplicates run without callbacks so only one stream of tokens reaches the client.
+    """
+    def __init__(
+        self,
+        routes: Sequence[ModelRoute],
+        call_timeout: float = LLM_CALL_TIMEOUT_SECONDS,
+        hedge: bool = LLM_HEDGE_ENABLED,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY_SECONDS,
+    ):
+        if not routes:
+            raise ValueError("ModelRouter needs at least one route")
+        self.routes = list(routes)
+        self.call_timeout = call_timeout
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        from langchain_groq import ChatGroq
+        routes = [
+            ModelRoute(name, ChatGroq(
+                model=name,
+                temperature=0.7,
+                groq_api_key=os.environ.get("GROQ_API_KEY"),
+                timeout=LLM_CALL_TIMEOUT_SECONDS,
+                max_retries=0,
+            ))
+            for name in [LLM_PRIMARY_MODEL] + LLM_FALLBACK_MODELS
+        ]
+        return cls(routes)
+
+    def turn(self, deadline_seconds: float = LLM_TURN_DEADLINE_SECONDS):
+        """Async context manager bounding a whole chat turn (all LLM and tool calls) by deadline_seconds."""
+        return _Turn(deadline_seconds)
+
+    def status(self) -> List[dict]:
+        return [
+            {"model": r.name, "breaker": r.breaker.state, "p95_seconds": r.latency.p95()}
+            for r in self.routes
+        ]
+
+    def bind_tools(self, tools, **kwargs) -> Runnable:
+        bound = [(route, route.model.bind_tools(tools, **kwargs)) for route in self.routes]
+
+        async def invoke(input, config: RunnableConfig):
+            return await self._ainvoke(bound, input, config)
+
+        return RunnableLambda(invoke, name="ModelRouter")
+
+    def _remaining(self) -> float:
+        deadline = _turn_deadline.get()
+        if deadline is None:
+            return self.call_timeout
+        return min(self.call_timeout, deadline - time.monotonic())
+
+    async def _ainvoke(self, bound: List[Tuple[ModelRoute, Runnable]], input, config: RunnableConfig):
+        last_error: Optional[BaseException] = None
+        for route, runnable in bound:
+            # Checked lazily, a half-open breaker admits its trial call only when it is actually made
+            if not route.breaker.allow():
+                continue
+            timeout = self._remaining()
+            if timeout <= 0:
+                raise asyncio.TimeoutError("Chat turn deadline exceeded")
+            try:
+                return await self._call_with_hedge(route, runnable, input, config, timeout)
+            except Exception as e:
+                print(f"[LLM] {route.name} failed, trying next model: {e!r}")
+                last_error = e
+        if last_error is None:
+            raise ModelUnavailableError("All models are unavailable (circuit breakers open)")
+        raise last_error
+
+    async def _call(self, route: ModelRoute, runnable: Runnable, input, config: Optional[RunnableConfig], timeout: float):
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(runnable.ainvoke(input, config), timeout)
+        except asyncio.CancelledError:
+            # Lost a hedge race or the turn was cancelled, not the model's fault
+            route.breaker.trial_in_flight = False
+            raise
+        except Exception:
+            route.breaker.record_failure()
+            raise
+        route.breaker.record_success()
+        route.latency.add(time.monotonic() - start)
+        usage = _turn_usage.get()
+        if usage is not None:
+            usage.add(getattr(result, "usage_metadata", None))
+        return result
+
+    async def _call_with_hedge(self, route: ModelRoute, runnable: Runnable, input, config: RunnableConfig, timeout: float):
+        p95 = route.latency.p95() if self.hedge else None
+        if p95 is None:
+            return await self._call(route, runnable, input, config, timeout)
+
+        deadline = time.monotonic() + timeout
+        pending = set()
+        error: Optional[BaseException] = None
+        try:
+            # Created inside the try, so a cancelled turn never leaves the primary call running
+            primary = asyncio.create_task(self._call(route, runnable, input, config, timeout))
+            pending.add(primary)
+            done, pending = await asyncio.wait(pending, timeout=min(max(p95, self.hedge_min_delay), timeout))
+            if primary in done:
+                return primary.result()
+
+            hedge_config = dict(config or {}, callbacks=None)
+            pending.add(asyncio.create_task(self._call(route, runnable, input, hedge_config, deadline - time.monotonic())))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+class _Turn:
+    def __init__(self, deadline_seconds: float):
+        self.deadline_seconds = deadline_seconds
+        self.usage = TurnUsage()
+        self._timeout = None
+        self._tokens = None
+
+    async def __aenter__(self):
+        self._timeout = asyncio.timeout(self.deadline_seconds)
+        await self._timeout.__aenter__()
+        self._tokens = (
+            _turn_deadline.set(time.monotonic() + self.deadline_seconds),
+            _turn_usage.set(self.usage),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        _turn_deadline.reset(self._tokens[0])
+        _turn_usage.reset(self._tokens[1])
+        return await self._timeout.__aexit__(exc_type, exc, tb)
@@ -0,0 +1,63 @@
+import asyncio
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from ai.agent import ChatRequest, Message
+from ai.conversation import ConversationManager
+from config import SessionLocal
+
+conversation_manager = ConversationManager()
+
+class ChatSession:
+    """
+    Conversation state kept in memory for the life of a WebSocket connection: the roadmap,
+    the conversation and a sliding window of recent messages. Messages are written to the DB
+    by a background task, one transaction per turn, in the order the turns happened.
+    """
+    def __init__(self, roadmap_id: int, conversation_id: uuid.UUID, history: List[Dict], window_size: int = 10):
+        self.roadmap_id = roadmap_id
+        self.conversation_id = conversation_id
+        self.window_size = window_size
+        self.window = deque((Message(role=m["role"], content=m["content"]) for m in history), maxlen=window_size)
+        self._writes: asyncio.Queue = asyncio.Queue()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def agent_request(self, content: str) -> ChatRequest:
+        messages = list(self.window) + [Message(role="user", content=content)]
+        return ChatRequest(messages=messages[-self.window_size:], roadmap_id=self.roadmap_id)
+
+    def commit_turn(self, content: str, reply: Optional[str] = None, tool_output: Any = None):
+        now = datetime.utcnow()
+        batch = [{"role": "user", "content": content, "timestamp": now}]
+        self.window.append(Message(role="user", content=content))
+        if reply is not None:
+            batch.append({"role": "assistant", "content": reply, "timestamp": datetime.utcnow(), "tool_output": tool_output})
+            self.window.append(Message(role="assistant", content=reply))
+        self._writes.put_nowait(batch)
+
+    def _persist(self, batch: List[Dict]):
+        db = SessionLocal()
+        try:
+            conversation_manager.append_messages(db, self.conversation_id, batch)
+        finally:
+            db.close()
+
+    async def _write_loop(self):
+        while True:
+            batch = await self._writes.get()
+            try:
+                await asyncio.to_thread(self._persist, batch)
+            except Exception as e:
+                print(f"[WS] failed to save messages for conversation {self.conversation_id}: {e}")
+            finally:
+                self._writes.task_done()
+
+    async def close(self):
+        """Waits for pending writes, then stops the writer."""
+        await self._writes.join()
+        if self._writer:
+            self._writer.cancel()
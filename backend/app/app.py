@@ -3,6 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from config import init_db
 from routes.auth import router as auth_router
 from routes.chat import router as chat_router
+from routes.fares import router as fares_router
+from routes.admin import router as admin_router
+from profiling import ProfilingMiddleware, install_default_executor
+from usage import usage_recorder
 from dotenv import load_dotenv
 from sqlalchemy import text
 from config import get_db
@@ -19,11 +23,22 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
 
 init_db()
 
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
 app.include_router(chat_router, prefix="/chat", tags=["Chat"])
+app.include_router(fares_router, prefix="/fares", tags=["Fares"])
+app.include_router(admin_router, prefix="/admin", tags=["Admin"])
+
+@app.on_event("startup")
+async def use_profiling_executor():
+    install_default_executor()
+
+@app.on_event("shutdown")
+def flush_usage():
+    usage_recorder.flush()
 
 @app.get("/")
 def root():
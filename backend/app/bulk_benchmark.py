@@ -0,0 +1,73 @@
+"""
+Measures NDJSON import/export throughput against the database in POSTGRES_URL.
+
+    python bulk_benchmark.py --messages 200000 --conversations 2000
+
+Creates a throwaway user with synthetic conversations, imports them through NdjsonImporter,
+exports them back through export_ndjson and deletes everything it created.
+"""
+import argparse
+import time
+import uuid
+import orjson
+from datetime import datetime
+from sqlalchemy import func, select, text
+from config import engine, init_db
+from bulk_io import NdjsonImporter, export_ndjson
+from schemas.models import ChatConversation, ChatMessage, UserInDB
+
+def generate(user_id: int, first_message_id: int, messages: int, conversations: int):
+    conversation_ids = [str(uuid.uuid4()) for _ in range(conversations)]
+    now = datetime.utcnow().isoformat()
+    yield orjson.dumps({"table": "users", "row": {
+        "id": user_id, "email": f"bench-{user_id}@example.com", "name": "Benchmark",
+        "hashed_password": "-", "type": "user", "created_at": now,
+    }})
+    for conversation_id in conversation_ids:
+        yield orjson.dumps({"table": "chat_conversations", "row": {
+            "id": conversation_id, "user_id": user_id, "created_at": now, "last_updated": now,
+        }})
+    for i in range(messages):
+        yield orjson.dumps({"table": "chat_messages", "row": {
+            "id": first_message_id + i,
+            "conversation_id": conversation_ids[i % conversations],
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i}: looking for flights from Almaty to Astana and a hotel near Baiterek",
+            "timestamp": now,
+            "tool_output_id": None,
+        }})
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--conversations", type=int, default=1000)
+    args = parser.parse_args()
+
+    init_db()
+    with engine.connect() as conn:
+        user_id = (conn.execute(select(func.max(UserInDB.id))).scalar() or 0) + 1
+        first_message_id = (conn.execute(select(func.max(ChatMessage.id))).scalar() or 0) + 1
+    lines = list(generate(user_id, first_message_id, args.messages, args.conversations))
+
+    try:
+        start = time.perf_counter()
+        importer = NdjsonImporter()
+        importer.add_lines(lines)
+        importer.commit()
+        elapsed = time.perf_counter() - start
+        print(f"import: {args.messages} messages in {elapsed:.2f}s ({args.messages / elapsed:,.0f} messages/s)")
+
+        start = time.perf_counter()
+        exported = sum(chunk.count(b"\n") for chunk in export_ndjson("conversations"))
+        elapsed = time.perf_counter() - start
+        print(f"export: {exported} rows in {elapsed:.2f}s ({exported / elapsed:,.0f} rows/s)")
+    finally:
+        with engine.begin() as conn:
+            conversations = select(ChatConversation.id).where(ChatConversation.user_id == user_id)
+            conn.execute(ChatMessage.__table__.delete().where(ChatMessage.conversation_id.in_(conversations)))
+            conn.execute(ChatConversation.__table__.delete().where(ChatConversation.user_id == user_id))
+            conn.execute(UserInDB.__table__.delete().where(UserInDB.id == user_id))
+            conn.execute(text("ANALYZE chat_messages"))
+
+if __name__ == "__main__":
+    main()
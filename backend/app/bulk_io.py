@@ -0,0 +1,166 @@
+import io
+import orjson
+from typing import Dict, Iterable, Iterator, List
+from sqlalchemy import ARRAY, Integer, Table, select
+from sqlalchemy.dialects.postgresql import JSONB
+from config import engine
+from schemas.models import (
+    Base, UserInDB, UserPreference, RoadmapInDB, RoadmapDayInDB, RoadmapTaskInDB, Ticket,
+    AccommodationInDB, Place, FoodPlaceInDB, ChatConversation, ChatMessage, ToolOutput, TokenUsage
+)
+
+EXPORT_BATCH_SIZE = 2000
+IMPORT_BATCH_SIZE = 20000
+
+# Tables per dataset, parents before children
+EXPORT_DATASETS: Dict[str, List[Table]] = {
+    "users": [UserInDB.__table__, UserPreference.__table__],
+    "roadmaps": [
+        RoadmapInDB.__table__, RoadmapDayInDB.__table__, RoadmapTaskInDB.__table__, Ticket.__table__,
+        AccommodationInDB.__table__, Place.__table__, FoodPlaceInDB.__table__,
+    ],
+    "conversations": [ChatConversation.__table__, ToolOutput.__table__, ChatMessage.__table__, TokenUsage.__table__],
+}
+
+def _columns(table: Table):
+    # Generated columns (e.g. chat_messages.content_tsv) are rebuilt by Postgres on import
+    return [c for c in table.columns if c.computed is None]
+
+def export_ndjson(dataset: str) -> Iterator[bytes]:
+    """
+    Streams every row of the dataset's tables as NDJSON lines {"table": ..., "row": {...}}.
+    Rows are read through a server-side cursor in EXPORT_BATCH_SIZE chunks, so memory stays constant.
+    All tables are read in one read-only REPEATABLE READ transaction, i.e. from a single snapshot,
+    so rows written mid-export never show up as children without their parents.
+    """
+    with engine.connect().execution_options(
+        isolation_level="REPEATABLE READ",
+        postgresql_readonly=True,
+        stream_results=True,
+        yield_per=EXPORT_BATCH_SIZE,
+    ) as conn:
+        for table in EXPORT_DATASETS[dataset]:
+            columns = _columns(table)
+            result = conn.execute(select(*columns).order_by(*table.primary_key.columns))
+            for partition in result.partitions():
+                yield b"".join(
+                    orjson.dumps({"table": table.name, "row": dict(row._mapping)}) + b"\n" for row in partition
+                )
+
+def _pg_array(values) -> str:
+    items = []
+    for v in values:
+        if v is None:
+            items.append("NULL")
+        else:
+            items.append('"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(items) + "}"
+
+def _csv_field(column, value) -> str:
+    # Unquoted empty field is NULL in COPY's csv format, every other value is quoted
+    if value is None:
+        return ""
+    if isinstance(column.type, JSONB):
+        value = orjson.dumps(value).decode()
+    elif isinstance(column.type, ARRAY):
+        value = _pg_array(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+class ImportConflict(ValueError):
+    pass
+
+class NdjsonImporter:
+    """
+    Loads NDJSON produced by export_ndjson. Rows are buffered per table and written with COPY into a
+    staging table, then moved with INSERT ... ON CONFLICT (primary key) DO NOTHING.
+    Only rows identical to the existing ones are skipped, so re-importing a file is harmless; a row whose id
+    already exists with different content fails the import, otherwise its children would be attached
+    to the unrelated existing row. Other unique violations (e.g. a taken email) fail it as well.
+    Buffers are always flushed in FK order, so children never land before their parents.
+    """
+    def __init__(self, batch_size: int = IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.tables = Base.metadata.sorted_tables
+        self.buffers: Dict[str, List[dict]] = {table.name: [] for table in self.tables}
+        self.counts: Dict[str, int] = {}
+        self.pending = 0
+        self.raw = engine.raw_connection()
+
+    def add_lines(self, lines: Iterable[bytes]):
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            record = orjson.loads(line)
+            table = record.get("table")
+            if table not in self.buffers:
+                raise ValueError(f"Unknown table: {table}")
+            self.buffers[table].append(record["row"])
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        with self.raw.cursor() as cursor:
+            for table in self.tables:
+                rows = self.buffers[table.name]
+                if rows:
+                    self._copy(cursor, table, rows)
+                    self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+                    self.buffers[table.name] = []
+        self.pending = 0
+
+    def _copy(self, cursor, table: Table, rows: List[dict]):
+        columns = _columns(table)
+        names = ", ".join(f'"{c.name}"' for c in columns)
+        buf = io.StringIO()
+        for row in rows:
+            buf.write(",".join(_csv_field(c, row.get(c.name)) for c in columns))
+            buf.write("\n")
+        buf.seek(0)
+        staging = f"import_{table.name}"
+        cursor.execute(f'CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE "{table.name}" INCLUDING DEFAULTS) ON COMMIT DROP')
+        cursor.execute(f"TRUNCATE {staging}")
+        cursor.copy_expert(f"COPY {staging} ({names}) FROM STDIN WITH (FORMAT csv)", buf)
+        self._check_conflicts(cursor, table, staging, columns)
+        keys = ", ".join(f'"{c.name}"' for c in table.primary_key.columns)
+        cursor.execute(f'INSERT INTO "{table.name}" ({names}) SELECT {names} FROM {staging} ON CONFLICT ({keys}) DO NOTHING')
+
+    def _check_conflicts(self, cursor, table: Table, staging: str, columns):
+        keys = [c.name for c in table.primary_key.columns]
+        join = " AND ".join(f's."{k}" = t."{k}"' for k in keys)
+        selected = ", ".join(f's."{k}"' for k in keys)
+        staged = ", ".join(f's."{c.name}"' for c in columns)
+        existing = ", ".join(f't."{c.name}"' for c in columns)
+        cursor.execute(
+            f'SELECT {selected} FROM {staging} s JOIN "{table.name}" t ON {join} '
+            f"WHERE ROW({staged}) IS DISTINCT FROM ROW({existing}) LIMIT 10"
+        )
+        conflicts = cursor.fetchall()
+        if conflicts:
+            ids = ", ".join(str(row[0] if len(row) == 1 else row) for row in conflicts)
+            raise ImportConflict(f"{table.name}: rows with id {ids} already exist with different content")
+
+    def _reset_sequences(self, cursor):
+        # Imported rows carry explicit ids, move serial sequences past them
+        for table in self.tables:
+            if self.counts.get(table.name) and "id" in table.c and isinstance(table.c.id.type, Integer):
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 0) + 1 FROM \"{table.name}\"), false)"
+                )
+
+    def commit(self) -> Dict[str, int]:
+        """Flushes the remaining rows and commits. On failure call rollback()."""
+        self.flush()
+        with self.raw.cursor() as cursor:
+            self._reset_sequences(cursor)
+        self.raw.commit()
+        self.raw.close()
+        return self.counts
+
+    def rollback(self):
+        try:
+            self.raw.rollback()
+        finally:
+            self.raw.close()
@@ -21,9 +21,50 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+# create_all() only creates missing tables, so columns and indexes added to
+# existing tables are applied here. Every statement must be idempotent and cheap,
+# they run on every start.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS tool_output_id INTEGER REFERENCES tool_outputs (id)",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS daily_token_budget INTEGER",
+    "ALTER TABLE token_usage ALTER COLUMN conversation_id DROP NOT NULL",
+]
+
+# Too slow to run at startup on a large chat_messages table, applied by `python upgrade_db.py`.
+# Adding the generated column rewrites chat_messages under an ACCESS EXCLUSIVE lock, so it needs
+# a maintenance window; the indexes are built CONCURRENTLY and do not block writes.
+MAINTENANCE_UPGRADES = [
+    "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_content_tsv ON chat_messages USING gin (content_tsv)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_conversation_id ON chat_messages (conversation_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_conversations_user_id ON chat_conversations (user_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_tool_output_id ON chat_messages (tool_output_id)",
+]
+
+def upgrade_db():
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+        pending = conn.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'chat_messages' AND column_name = 'content_tsv'"
+        )).first() is None
+    if pending:
+        print("WARNING: chat_messages.content_tsv is missing, /chat/search fails until "
+              "`python upgrade_db.py` is run during a maintenance window.")
+
+def run_maintenance_upgrades():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in MAINTENANCE_UPGRADES:
+            print(statement)
+            conn.execute(text(statement))
+
 def init_db():
     print("Initializing the database...")
     Base.metadata.create_all(bind=engine)
+    upgrade_db()
 
 def reset_db():
     print("Dropping all tables...")
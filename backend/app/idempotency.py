@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", 10000))
+
+class IdempotencyKeyMismatch(Exception):
+    pass
+
+def fingerprint(*parts: Any) -> str:
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode()).hexdigest()
+
+class IdempotencyStore:
+    """
+    Remembers the result of a request per idempotency key for a bounded time and size.
+    A duplicate that arrives while the first request is still running waits for its result,
+    a duplicate that arrives later gets the stored result replayed. Failed requests are not stored,
+    so the client can retry them.
+    """
+    def __init__(self, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._completed: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    def _get_completed(self, key: str):
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= self.ttl_seconds:
+            del self._completed[key]
+            return None
+        return entry
+
+    def _store(self, key: str, request_fingerprint: str, result: Any):
+        self._completed[key] = (time.monotonic(), request_fingerprint, result)
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+
+    async def run(self, key: str, request_fingerprint: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        completed = self._get_completed(key)
+        if completed is not None:
+            if completed[1] != request_fingerprint:
+                raise IdempotencyKeyMismatch(key)
+            return completed[2]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            if in_flight[0] != request_fingerprint:
+                raise IdempotencyKeyMismatch(key)
+            # shield: a disconnecting duplicate must not cancel the original turn
+            return await asyncio.shield(in_flight[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (request_fingerprint, future)
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when no duplicate is waiting on it
+            future.exception()
+            raise
+        else:
+            self._store(key, request_fingerprint, result)
+            future.set_result(result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
@@ -0,0 +1,176 @@
+import asyncio
+import cProfile
+import contextvars
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from auth_utils import verify_access_token
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/nfac-profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 50))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_HEADER = b"x-profile"
+PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.pstats$")
+
+# cProfile hooks the whole interpreter thread, so only one request is profiled at a time
+_profiling_lock = threading.Lock()
+# Set for the profiled request, copied into its child tasks and into executor jobs it submits
+_active_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("active_profile", default=None)
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def _is_admin(scope) -> bool:
+    authorization = _header(scope, b"authorization") or ""
+    if not authorization.lower().startswith("bearer "):
+        return False
+    payload = verify_access_token(authorization[7:])
+    return bool(payload) and payload.get("type") == "admin"
+
+def list_profiles() -> List[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.is_file() and PROFILE_NAME_RE.match(entry.name):
+            stat = entry.stat()
+            profiles.append({"name": entry.name, "size": stat.st_size, "created_at": stat.st_mtime})
+    return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+def profile_path(name: str) -> Optional[str]:
+    if not PROFILE_NAME_RE.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+def render_profile(path: str, limit: int = 60, sort: str = "cumulative") -> str:
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+def _save(stats: pstats.Stats, name: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stats.dump_stats(os.path.join(PROFILE_DIR, name))
+    # Ring buffer: drop the oldest profiles beyond PROFILE_MAX_FILES
+    for stale in list_profiles()[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, stale["name"]))
+        except FileNotFoundError:
+            pass
+
+class RequestProfile:
+    """
+    Profiles of one request: one for the event loop thread and one per executor job it submitted.
+    The loop profiler's clock only advances while code of this request's context is running,
+    so coroutines of concurrent requests show up with zero time instead of inflating the profile.
+    """
+    def __init__(self, mode: str):
+        self.timer = time.thread_time if mode == "cpu" else time.perf_counter
+        self.loop_profiler = cProfile.Profile(self._loop_timer())
+        self.thread_profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def _loop_timer(self):
+        elapsed = 0.0
+        last = self.timer()
+
+        def timer():
+            nonlocal elapsed, last
+            now = self.timer()
+            if _active_profile.get() is self:
+                elapsed += now - last
+            last = now
+            return elapsed
+        return timer
+
+    def run_in_thread(self, fn, *args, **kwargs):
+        profiler = cProfile.Profile(self.timer)
+        profiler.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with self._lock:
+                self.thread_profilers.append(profiler)
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.loop_profiler)
+        with self._lock:
+            for profiler in self.thread_profilers:
+                stats.add(profiler)
+        return stats
+
+class ProfilingExecutor(ThreadPoolExecutor):
+    """
+    Thread pool that extends the active request profile to the jobs submitted from that request,
+    e.g. langchain's sync tools and asyncio.to_thread once installed as the loop's default executor.
+    """
+    def submit(self, fn, /, *args, **kwargs):
+        profile = _active_profile.get()
+        if profile is None:
+            return super().submit(fn, *args, **kwargs)
+        return super().submit(profile.run_in_thread, fn, *args, **kwargs)
+
+def install_default_executor():
+    asyncio.get_running_loop().set_default_executor(ProfilingExecutor())
+
+class ProfilingMiddleware:
+    """
+    Captures a cProfile of a request when an admin sends "X-Profile: wall" (or "cpu"),
+    or for a PROFILE_SAMPLE_RATE fraction of requests. The profile is stored as a .pstats file
+    and its name is returned in the X-Profile-Id response header.
+    It covers the request's own tasks plus the jobs they run on a ProfilingExecutor;
+    sync endpoints run on Starlette's threadpool and are not recorded.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    def _mode(self, scope) -> Optional[str]:
+        if scope["type"] != "http" or scope["path"].startswith("/admin/profiles"):
+            return None
+        requested = (_header(scope, PROFILE_HEADER) or "").strip().lower()
+        if requested and _is_admin(scope):
+            return "cpu" if requested == "cpu" else "wall"
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return "wall"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        mode = self._mode(scope)
+        if mode is None or not _profiling_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        slug = re.sub(r"[^\w]+", "_", scope["path"]).strip("_") or "root"
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 1_000_000_000:09d}-{scope['method']}-{slug}-{mode}.pstats"
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", name.encode())]
+            await send(message)
+
+        profile = RequestProfile(mode)
+        token = _active_profile.set(profile)
+        try:
+            profile.loop_profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_header)
+            finally:
+                profile.loop_profiler.disable()
+                _active_profile.reset(token)
+            try:
+                _save(profile.stats(), name)
+            except Exception as e:
+                print(f"[PROFILE] failed to save {name}: {e}")
+        finally:
+            _profiling_lock.release()
@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
+from datetime import datetime, date
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from config import get_db
+from schemas.models import UserInDB, TokenUsage
+from routes.chat import get_current_user, agent
+from bulk_io import EXPORT_DATASETS, NdjsonImporter, export_ndjson
+from profiling import list_profiles, profile_path, render_profile
+from usage import usage_recorder
+
+router = APIRouter()
+
+def get_current_admin(user: UserInDB = Depends(get_current_user)):
+    if user.type != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+@router.get("/export/{dataset}")
+def export_dataset(dataset: str, admin: UserInDB = Depends(get_current_admin)):
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset, expected one of: {', '.join(EXPORT_DATASETS)}")
+    filename = f"{dataset}-{datetime.utcnow():%Y%m%dT%H%M%S}.ndjson"
+    return StreamingResponse(
+        export_ndjson(dataset),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/import")
+async def import_ndjson(request: Request, admin: UserInDB = Depends(get_current_admin)):
+    """Imports an NDJSON body produced by /admin/export/*, streamed in chunks and written with COPY."""
+    importer = await run_in_threadpool(NdjsonImporter)
+    tail = b""
+    try:
+        async for chunk in request.stream():
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            await run_in_threadpool(importer.add_lines, lines)
+        await run_in_threadpool(importer.add_lines, [tail])
+        counts = await run_in_threadpool(importer.commit)
+    except Exception as e:
+        await run_in_threadpool(importer.rollback)
+        raise HTTPException(status_code=400, detail=f"Import failed: {e}")
+    return {"message": "Import completed", "rows": counts}
+
+@router.get("/profiles")
+def get_profiles(admin: UserInDB = Depends(get_current_admin)):
+    return list_profiles()
+
+@router.get("/profiles/{name}")
+def get_profile(
+    name: str,
+    format: str = Query("pstats", pattern="^(pstats|text)$"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls)$"),
+    admin: UserInDB = Depends(get_current_admin)
+):
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return PlainTextResponse(render_profile(path, sort=sort))
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+@router.get("/llm")
+def get_llm_status(admin: UserInDB = Depends(get_current_admin)):
+    return agent.llm.status()
+
+@router.get("/usage")
+def get_usage(
+    day: Optional[date] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    admin: UserInDB = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Per-user token totals for a day (UTC, default today), heaviest users first."""
+    usage_recorder.flush()
+    day = day or datetime.utcnow().date()
+    total = func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens)
+    rows = db.query(
+        TokenUsage.user_id,
+        func.sum(TokenUsage.prompt_tokens),
+        func.sum(TokenUsage.completion_tokens),
+        func.sum(TokenUsage.requests),
+        func.count(TokenUsage.conversation_id),
+    ).filter(TokenUsage.day == day).group_by(TokenUsage.user_id).order_by(total.desc()).limit(limit).all()
+    return {
+        "day": day,
+        "users": [
+            {
+                "user_id": user_id,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "requests": requests,
+                "conversations": conversations,
+            }
+            for user_id, prompt_tokens, completion_tokens, requests, conversations in rows
+        ],
+    }
@@ -26,7 +26,6 @@ class CreateUser(BaseModel):
     name: str
     email: str
     password: str
-    type: str = "user"
 
 @router.post("/login", response_model=Token)
 def login(user: UserLogin, db: Session = Depends(get_db)):
@@ -64,7 +63,8 @@ def register(user: CreateUser, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     hashed_password = hash_password(user.password)
-    new_user = UserInDB(email=user.email, hashed_password=hashed_password, name=user.name, type=user.type)
+    # Self-registration always creates a regular user, admins are promoted in the database
+    new_user = UserInDB(email=user.email, hashed_password=hashed_password, name=user.name, type="user")
     db.add(new_user)
     db.commit()
 
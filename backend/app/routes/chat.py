@@ -1,15 +1,20 @@
-from fastapi import APIRouter, HTTPException, Header, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Header, Depends, status, Query, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer
-from typing import Optional, List
-from ai.agent import AIAgent, ChatRequest, ChatResponse, Message
+from typing import Optional, List, Union
+from ai.agent import AIAgent, AssistantUnavailableError, ChatRequest, ChatResponse, Message, UNAVAILABLE_REPLY
 from ai.conversation import ConversationManager
+from ai.session import ChatSession
 import uuid
 from auth_utils import verify_access_token
 from sqlalchemy.orm import Session
-from config import get_db
-from schemas.models import UserInDB, RoadmapInDB, ChatConversation, ChatConversationSchema, ChatMessageSchema
+from config import get_db, SessionLocal
+from datetime import datetime, timedelta
+from schemas.models import UserInDB, RoadmapInDB, ChatConversation, ChatConversationSchema, ChatMessageSchema, ChatSearchResponse, TokenUsage, UserUsageResponse
 from tools.toolbelt import TravelToolBelt
 from pydantic import BaseModel
+from idempotency import IdempotencyStore, IdempotencyKeyMismatch, fingerprint
+from usage import usage_recorder, TokenBudgetExceeded
 
 class UserChatRequest(BaseModel):
     messages: List[Message]
@@ -17,11 +22,12 @@ class UserChatRequest(BaseModel):
 class ChatApiResponse(BaseModel):
     response: str
     conversation_id: str
-    tool_output: Optional[List[dict]]
+    tool_output: Optional[Union[List[dict], dict]] = None
 
 router = APIRouter()
 agent = AIAgent()
 conversation_manager = ConversationManager()
+idempotency_store = IdempotencyStore()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -36,32 +42,34 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-@router.post("/", response_model=ChatApiResponse)
-async def chat(
-    request: UserChatRequest,
-    conversation_id: Optional[str] = Query(None),
-    user: UserInDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+def get_or_create_roadmap(db: Session, user: UserInDB) -> RoadmapInDB:
+    roadmap = db.query(RoadmapInDB).filter(RoadmapInDB.user_id == user.id).first()
+    if not roadmap:
+        roadmap = RoadmapInDB(user_id=user.id, title=f"Trip for {user.name}", destination="")
+        db.add(roadmap)
+        db.commit()
+        db.refresh(roadmap)
+    return roadmap
+
+async def run_chat_turn(request: UserChatRequest, conversation_id: Optional[str], user: UserInDB, db: Session) -> ChatApiResponse:
+    # Reject before anything is stored or sent to the LLM
     try:
-        if not conversation_id:
-            conversation_id = str(uuid.uuid4())
-            # Create a new conversation in the DB and associate it with the user
-            conversation_manager.create_conversation(db, user, conversation_id)
-        
-        # Add user message to conversation history
-        for message in request.messages:
-            conversation_manager.add_message(db, user, conversation_id, message.role, message.content)
-        
-        context_messages = conversation_manager.get_context(db, user, conversation_id)
+        usage_recorder.check_budget(db, user.id, usage_recorder.budget_for(user), "".join(message.content for message in request.messages))
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+    try:
+        conversation_uuid = uuid.UUID(conversation_id) if conversation_id else uuid.uuid4()
+        conversation_id = str(conversation_uuid)
+        conversation = conversation_manager.get_conversation(db, user, conversation_id)
+
+        # The turn is only persisted once the agent has answered, so the context is built in memory
+        new_messages = [{"role": message.role, "content": message.content} for message in request.messages]
+        history = conversation_manager.get_context(db, user, conversation_id) if conversation else []
+        context_messages = (history + new_messages)[-10:]
         
         # Find or create a roadmap for the user
-        roadmap = db.query(RoadmapInDB).filter(RoadmapInDB.user_id == user.id).first()
-        if not roadmap:
-            roadmap = RoadmapInDB(user_id=user.id, title=f"Trip for {user.name}", destination="")
-            db.add(roadmap)
-            db.commit()
-            db.refresh(roadmap)
+        roadmap = get_or_create_roadmap(db, user)
 
         # Prepare request for the agent, now including roadmap_id
         agent_request = ChatRequest(messages=context_messages, roadmap_id=roadmap.id)
@@ -69,23 +77,181 @@ async def chat(
         # Initialize the toolbelt with the db session and roadmap_id
         toolbelt = TravelToolBelt(db=db, roadmap_id=roadmap.id)
         
-        # Get response from the agent
-        agent_response = await agent.chat(agent_request, db)
-        
-        # Add assistant's response to conversation history
-        conversation_manager.add_message(db, user, conversation_id, "assistant", agent_response.response)
+        # Get response from the agent; tokens are recorded even if the turn fails or is cancelled,
+        # against the conversation only once it is stored
+        usage = {}
+        try:
+            try:
+                agent_response = await agent.chat(agent_request, on_usage=usage.update)
+            except AssistantUnavailableError:
+                # Nothing stored and nothing cached under the Idempotency-Key, a retry runs the turn again
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=UNAVAILABLE_REPLY)
+
+            # Store the user's messages and the assistant's response together
+            if not conversation:
+                conversation = conversation_manager.create_conversation(db, user, conversation_id)
+            now = datetime.utcnow()
+            conversation_manager.append_messages(db, conversation_uuid, [
+                dict(message, timestamp=now) for message in new_messages
+            ] + [
+                {"role": "assistant", "content": agent_response.response, "timestamp": datetime.utcnow(), "tool_output": agent_response.tool_output}
+            ])
+        finally:
+            usage_recorder.record(user.id, conversation_uuid if conversation else None, usage)
         
         return ChatApiResponse(response=agent_response.response, conversation_id=conversation_id, tool_output=agent_response.tool_output)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/", response_model=ChatApiResponse)
+async def chat(
+    request: UserChatRequest,
+    conversation_id: Optional[str] = Query(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not idempotency_key:
+        return await run_chat_turn(request, conversation_id, user, db)
+
+    # Retries with the same key wait for the in-flight turn or replay its stored response
+    key = f"{user.id}:{idempotency_key}"
+    request_fingerprint = fingerprint(conversation_id, request.model_dump_json())
+    try:
+        return await idempotency_store.run(key, request_fingerprint, lambda: run_chat_turn(request, conversation_id, user, db))
+    except IdempotencyKeyMismatch:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+@router.websocket("/ws")
+async def chat_ws(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    conversation_id: Optional[str] = Query(None)
+):
+    # The handshake uses its own short-lived session, closed before accept(), so an open socket
+    # doesn't hold a pooled connection; only plain ids and values are kept for the connection
+    db = SessionLocal()
+    try:
+        # Authenticate once per connection; browsers cannot set headers on a WebSocket, so the token comes in the query
+        payload = verify_access_token(token) if token else None
+        user = db.query(UserInDB).filter(UserInDB.email == payload["sub"]).first() if payload and "sub" in payload else None
+        if user is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        conversation = conversation_manager.get_conversation(db, user, conversation_id) if conversation_id else None
+        if conversation is None:
+            try:
+                conversation = conversation_manager.create_conversation(db, user, conversation_id)
+            except Exception:
+                # Malformed id, or an id that belongs to another user's conversation
+                db.rollback()
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+        user_id, budget = user.id, usage_recorder.budget_for(user)
+        history = conversation_manager.get_context(db, user, str(conversation.id))
+        session = ChatSession(get_or_create_roadmap(db, user).id, conversation.id, history)
+    finally:
+        db.close()
+
+    await websocket.accept()
+    session.start()
+    await websocket.send_json({"type": "session", "conversation_id": str(session.conversation_id)})
+    try:
+        while True:
+            data = await websocket.receive_json()
+            content = data.get("content", "").strip() if isinstance(data, dict) else ""
+            if not content:
+                await websocket.send_json({"type": "error", "detail": "Message content is required"})
+                continue
+            db = SessionLocal()
+            try:
+                usage_recorder.check_budget(db, user_id, budget, content)
+            except TokenBudgetExceeded as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            finally:
+                db.close()
+
+            final = None
+            try:
+                async for chunk in agent.stream_chat(
+                    session.agent_request(content),
+                    on_usage=lambda usage: usage_recorder.record(user_id, session.conversation_id, usage),
+                ):
+                    if isinstance(chunk, ChatResponse):
+                        final = chunk
+                    else:
+                        await websocket.send_json({"type": "token", "content": chunk})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                session.commit_turn(content)
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+
+            session.commit_turn(content, final.response, final.tool_output)
+            await websocket.send_json(jsonable_encoder({
+                "type": "message",
+                "response": final.response,
+                "conversation_id": str(session.conversation_id),
+                "tool_output": final.tool_output,
+            }))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.close()
+
 @router.get("/conversations", response_model=List[ChatConversationSchema])
 async def get_user_conversations(user: UserInDB = Depends(get_current_user), db: Session = Depends(get_db)):
     return conversation_manager.get_user_conversations(db, user)
 
+@router.get("/usage", response_model=UserUsageResponse)
+def get_usage(
+    days: int = Query(30, ge=1, le=365),
+    user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Sync endpoint, so the pending-rollup flush runs in the threadpool
+    usage_recorder.flush()
+    today = datetime.utcnow().date()
+    rollups = db.query(TokenUsage).filter(
+        TokenUsage.user_id == user.id,
+        TokenUsage.day > today - timedelta(days=days)
+    ).order_by(TokenUsage.day.desc(), TokenUsage.updated_at.desc()).all()
+    used = sum(r.prompt_tokens + r.completion_tokens for r in rollups if r.day == today)
+    budget = usage_recorder.budget_for(user)
+    return UserUsageResponse(
+        day=today,
+        used_tokens=used,
+        daily_budget=budget,
+        remaining_tokens=max(budget - used, 0) if budget is not None else None,
+        rollups=rollups,
+    )
+
+@router.get("/search", response_model=ChatSearchResponse)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    results = conversation_manager.search_messages(db, user, q, limit=limit, offset=offset)
+    return ChatSearchResponse(query=q, limit=limit, offset=offset, results=results)
+
 @router.get("/conversation/{conversation_id}", response_model=ChatConversationSchema)
 async def get_conversation(conversation_id: str, user: UserInDB = Depends(get_current_user), db: Session = Depends(get_db)):
     conversation = conversation_manager.get_conversation(db, user, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return conversation 
\ No newline at end of file
+    return conversation
+
+@router.get("/tool-outputs/{tool_output_id}")
+async def get_tool_output(tool_output_id: int, user: UserInDB = Depends(get_current_user), db: Session = Depends(get_db)):
+    tool_output = conversation_manager.get_tool_output(db, user, tool_output_id)
+    if not tool_output:
+        raise HTTPException(status_code=404, detail="Tool output not found")
+    return {"id": tool_output.id, "data": tool_output.data}
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from config import get_db
+from schemas.models import UserInDB, RoadmapInDB
+from routes.chat import get_current_user
+from tools.fare_analytics import get_fare_table, summarize, NO_SEARCH_MESSAGE
+
+router = APIRouter()
+
+@router.get("/analytics")
+def fare_analytics(
+    max_stops: Optional[int] = Query(None, ge=0),
+    airline: Optional[str] = Query(None),
+    user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    roadmap = db.query(RoadmapInDB).filter(RoadmapInDB.user_id == user.id).first()
+    table = get_fare_table(roadmap.id if roadmap else None)
+    if table is None:
+        raise HTTPException(status_code=404, detail=NO_SEARCH_MESSAGE)
+    try:
+        return summarize(table, max_stops=max_stops, airline=airline)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
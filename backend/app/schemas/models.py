@@ -1,12 +1,12 @@
 from sqlalchemy import (
-    Column, String, Integer, Float, DateTime, Date, Time, ForeignKey, Text, Enum, ARRAY
+    Column, String, Integer, Float, DateTime, Date, Time, ForeignKey, Text, Enum, ARRAY, Computed, Index, UniqueConstraint
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime, date, time
 from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR, JSONB
 import uuid
 
 # Pydantic Schemas for API responses
@@ -15,10 +15,43 @@ class ChatMessageSchema(BaseModel):
     role: str
     content: str
     timestamp: datetime
+    # Structured tool output is loaded separately via /chat/tool-outputs/{id}
+    tool_output_id: Optional[int] = None
 
     class Config:
         from_attributes = True
 
+class TokenUsageSchema(BaseModel):
+    conversation_id: Optional[uuid.UUID]
+    day: date
+    prompt_tokens: int
+    completion_tokens: int
+    requests: int
+
+    class Config:
+        from_attributes = True
+
+class UserUsageResponse(BaseModel):
+    day: date
+    used_tokens: int
+    daily_budget: Optional[int]
+    remaining_tokens: Optional[int]
+    rollups: List[TokenUsageSchema] = []
+
+class ChatSearchResultSchema(BaseModel):
+    message_id: int
+    conversation_id: uuid.UUID
+    role: str
+    headline: str
+    rank: float
+    timestamp: datetime
+
+class ChatSearchResponse(BaseModel):
+    query: str
+    limit: int
+    offset: int
+    results: List[ChatSearchResultSchema] = []
+
 class ChatConversationSchema(BaseModel):
     id: uuid.UUID
     user_id: int
@@ -40,6 +73,8 @@ class UserInDB(Base):
     hashed_password = Column(String, nullable=False)
     type = Column(String, nullable=False, default="user")
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Overrides DAILY_TOKEN_BUDGET for this user, 0 means unlimited
+    daily_token_budget = Column(Integer, nullable=True)
     
     # Relationships
     roadmaps = relationship("RoadmapInDB", back_populates="user")
@@ -168,7 +203,7 @@ class Token(BaseModel):
 class ChatConversation(Base):
     __tablename__ = "chat_conversations"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     messages = relationship("ChatMessage", back_populates="conversation", cascade="all, delete-orphan")
@@ -179,11 +214,45 @@ class ChatConversation(Base):
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(UUID(as_uuid=True), ForeignKey("chat_conversations.id"), nullable=False)
+    conversation_id = Column(UUID(as_uuid=True), ForeignKey("chat_conversations.id"), nullable=False, index=True)
     role = Column(String, nullable=False)
     content = Column(Text, nullable=False)
+    # Maintained by Postgres on every insert/update, used by /chat/search only, so never loaded with the row.
+    # Existing databases get it from upgrade_db.py
+    content_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('english', coalesce(content, ''))", persisted=True)))
     timestamp = Column(DateTime, default=datetime.utcnow)
+    tool_output_id = Column(Integer, ForeignKey("tool_outputs.id"), nullable=True, index=True)
     conversation = relationship("ChatConversation", back_populates="messages")
+    tool_output = relationship("ToolOutput")
+
+    __table_args__ = (
+        Index("ix_chat_messages_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ToolOutput(Base):
+    __tablename__ = "tool_outputs"
+    id = Column(Integer, primary_key=True, index=True)
+    # sha256 of the canonical JSON, identical outputs are stored once
+    content_hash = Column(String(64), unique=True, nullable=False)
+    data = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class TokenUsage(Base):
+    """Daily LLM token rollup per user and conversation."""
+    __tablename__ = "token_usage"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # NULL for turns that failed before their new conversation was stored
+    conversation_id = Column(UUID(as_uuid=True), ForeignKey("chat_conversations.id"), nullable=True, index=True)
+    day = Column(Date, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    requests = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "conversation_id", "day", name="uq_token_usage_user_conversation_day"),
+    )
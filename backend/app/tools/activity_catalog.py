@@ -0,0 +1,117 @@
+import json
+import os
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+ACTIVITIES_DATA_PATH = os.environ.get("ACTIVITIES_DATA_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "activities.json"))
+
+# Share of the daily budget a single meal may take
+MEAL_BUDGET_SHARE = 0.5
+MATCH_WEIGHT = 2.0
+RATING_WEIGHT = 1.0
+BUDGET_WEIGHT = 0.25
+
+_catalog = None
+
+def _normalize(tag: str) -> str:
+    return (tag or "").strip().lower()
+
+class CatalogSection:
+    """
+    One kind of catalog entry (places or food places) in columnar form, with an inverted index
+    from tag/category to row ids and a row-id index per city.
+    """
+    def __init__(self, rows: List[dict], price_field: str):
+        self.rows = rows
+        self.rating = np.asarray([row.get("rating", 0) for row in rows], dtype=np.float64)
+        self.price = np.asarray([row.get(price_field, 0) for row in rows], dtype=np.float64)
+        tag_index: Dict[str, set] = defaultdict(set)
+        city_index: Dict[str, List[int]] = defaultdict(list)
+        for row_id, row in enumerate(rows):
+            for tag in list(row.get("tags", [])) + [row.get("category", "")]:
+                if _normalize(tag):
+                    tag_index[_normalize(tag)].add(row_id)
+            city_index[row["city"].lower()].append(row_id)
+        self.tag_index = {tag: np.asarray(sorted(ids), dtype=np.int64) for tag, ids in tag_index.items()}
+        self.city_index = {city: np.asarray(ids, dtype=np.int64) for city, ids in city_index.items()}
+
+    def _postings(self, tag: str) -> Optional[np.ndarray]:
+        tag = _normalize(tag)
+        postings = self.tag_index.get(tag)
+        if postings is None and tag.endswith("s"):
+            postings = self.tag_index.get(tag[:-1])
+        return postings
+
+    def top_k(self, city: str, tags: List[str], max_price: Optional[float], k: int) -> List[dict]:
+        in_city = np.zeros(len(self.rows), dtype=bool)
+        in_city[self.city_index.get(city, np.empty(0, dtype=np.int64))] = True
+        matches = np.zeros(len(self.rows), dtype=np.float64)
+        tags = [t for t in {_normalize(t) for t in tags or []} if t]
+        for tag in tags:
+            postings = self._postings(tag)
+            if postings is not None:
+                matches[postings] += 1
+        eligible = in_city.copy()
+        score = RATING_WEIGHT * self.rating / 5
+        if max_price:
+            eligible &= self.price <= max_price
+            score = score + BUDGET_WEIGHT * (1 - self.price / max_price)
+        if tags:
+            score = score + MATCH_WEIGHT * matches / len(tags)
+            # Only fall back to unmatched entries when nothing affordable matches
+            if np.any(matches[eligible] > 0):
+                eligible &= matches > 0
+        candidates = np.flatnonzero(eligible)
+        if candidates.size == 0:
+            return []
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-score[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-score[candidates], kind="stable")]
+        return [dict(self.rows[i], score=round(float(score[i]), 3)) for i in ranked]
+
+class ActivityCatalog:
+    """In-memory activity and restaurant catalog loaded from a local dataset (activities.json)."""
+    def __init__(self, data: dict):
+        self.currency = data.get("currency", "KZT")
+        self.city_aliases: Dict[str, str] = {}
+        places, food_places = [], []
+        for city in data.get("cities", []):
+            for key in [city["name"]] + city.get("aliases", []):
+                self.city_aliases[key.lower()] = city["name"].lower()
+            places.extend(dict(row, city=city["name"]) for row in city.get("places", []))
+            food_places.extend(dict(row, city=city["name"]) for row in city.get("food_places", []))
+        self.places = CatalogSection(places, "price")
+        self.food_places = CatalogSection(food_places, "avg_price")
+
+    @classmethod
+    def from_file(cls, path: str = ACTIVITIES_DATA_PATH) -> "ActivityCatalog":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def resolve_city(self, destination: str) -> Optional[str]:
+        return self.city_aliases.get((destination or "").strip().lower())
+
+    def recommend(
+        self,
+        destination: str,
+        interests: List[str],
+        food_types: Optional[List[str]] = None,
+        daily_budget: Optional[float] = None,
+        k: int = 5,
+    ) -> Optional[dict]:
+        city = self.resolve_city(destination)
+        if city is None:
+            return None
+        return {
+            "places": self.places.top_k(city, interests, daily_budget, k),
+            "food_places": self.food_places.top_k(
+                city, food_types or [], daily_budget * MEAL_BUDGET_SHARE if daily_budget else None, k
+            ),
+        }
+
+def get_catalog() -> ActivityCatalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = ActivityCatalog.from_file()
+    return _catalog
@@ -1,27 +1,60 @@
 from sqlalchemy.orm import Session
-from schemas.models import Place
+from schemas.models import Place, FoodPlaceInDB, RoadmapInDB
+from typing import Any, List, Optional
+from tools.activity_catalog import get_catalog
 
-def find_activities(db: Session, roadmap_id: int, destination: str, interests: list) -> str:
+def find_activities(
+    db: Session,
+    roadmap_id: int,
+    destination: str,
+    interests: list,
+    food_types: Optional[List[str]] = None,
+    daily_budget: Optional[int] = None,
+    limit: int = 5,
+) -> Any:
     """
-    Finds activities based on user interests and saves them to the database.
-    This is a mock tool.
+    Finds the top activities and food places for the destination in the local catalog, scored against
+    the given interests/food types/daily budget (falling back to the user's saved preferences),
+    and bulk-saves them to the roadmap.
     """
-    print(f"[TOOL] find_activities called with: roadmap_id={roadmap_id}, destination={destination}, interests={interests}")
+    print(f"[TOOL] find_activities called with: roadmap_id={roadmap_id}, destination={destination}, interests={interests}, food_types={food_types}, daily_budget={daily_budget}")
     try:
-        for interest in interests:
-            activity = Place(
+        roadmap = db.get(RoadmapInDB, roadmap_id)
+        preferences = roadmap.user.preferences if roadmap and roadmap.user else None
+        if preferences:
+            interests = interests or preferences.interests or []
+            food_types = food_types or preferences.food_type or []
+            daily_budget = daily_budget or preferences.daily_budget
+
+        recommendations = get_catalog().recommend(destination, interests, food_types, daily_budget, k=limit)
+        if not recommendations or not (recommendations["places"] or recommendations["food_places"]):
+            return f"No activities found in {destination} for interests: {', '.join(interests or [])}."
+
+        db.add_all([
+            Place(
+                roadmap_id=roadmap_id,
+                name=p["name"],
+                category=p["category"],
+                location=f"{p['location']}, {p['city']}",
+                duration_min=p["duration_min"],
+                rating=p["rating"],
+                url=p["url"]
+            )
+            for p in recommendations["places"]
+        ] + [
+            FoodPlaceInDB(
                 roadmap_id=roadmap_id,
-                name=f"{interest.capitalize()} Spot",
-                category=interest,
-                location=destination,
-                duration_min=120,
-                rating=4.5,
-                url=f"https://example.com/activity/{interest}"
+                name=f["name"],
+                category=f["category"],
+                location=f"{f['location']}, {f['city']}",
+                avg_price=f["avg_price"],
+                rating=f["rating"],
+                url=f["url"]
             )
-            db.add(activity)
-        
+            for f in recommendations["food_places"]
+        ])
         db.commit()
-        return f"Found and saved {len(interests)} activities in {destination} based on your interests."
+        return recommendations
     except Exception as e:
         db.rollback()
-        return f"An error occurred while finding activities: {e}" 
\ No newline at end of file
+        return f"An error occurred while finding activities: {e}"
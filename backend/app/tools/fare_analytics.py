@@ -0,0 +1,185 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+OFFERS_MAX_ROADMAPS = 512
+NO_SEARCH_MESSAGE = "No recent flight search for this trip. Call find_tickets_tool first, then analyze its offers."
+
+# Table of every offer of the roadmap's latest ticket search, filled by find_tickets, least recently used evicted first
+_offers_by_roadmap: "OrderedDict[int, FareTable]" = OrderedDict()
+_offers_lock = threading.Lock()
+
+class FareTable:
+    """
+    Columnar view over flight offers. One row per offer, every column is a numpy array,
+    so all analytics below are vectorized over the whole result set.
+    """
+    def __init__(self, offers: List[dict], price, duration_min, stops, airline, currency: str):
+        self.offers = offers
+        self.price = np.asarray(price, dtype=np.float64)
+        self.duration_min = np.asarray(duration_min, dtype=np.float64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        self.airline = np.asarray(airline, dtype=object)
+        self.currency = currency
+
+    def __len__(self):
+        return len(self.offers)
+
+    @classmethod
+    def from_serpapi(cls, options: List[dict], currency: str) -> "FareTable":
+        """
+        Builds the table from raw SerpAPI Google Flights options (best_flights + other_flights).
+        Each option is a whole itinerary: its legs give the stop count, total_duration the door-to-door time.
+        """
+        price, duration, stops, airline, rows = [], [], [], [], []
+        for option in options:
+            legs = option.get("flights") or []
+            if not legs:
+                continue
+            try:
+                price.append(float(option.get("price")))
+            except (TypeError, ValueError):
+                price.append(float("nan"))
+            duration.append(option.get("total_duration") or sum(leg.get("duration", 0) for leg in legs))
+            stops.append(len(legs) - 1)
+            airline.append(legs[0].get("airline", "Unknown"))
+            rows.append({
+                "airline": airline[-1],
+                "from": legs[0].get("departure_airport", {}).get("id"),
+                "to": legs[-1].get("arrival_airport", {}).get("id"),
+                "departure": legs[0].get("departure_airport", {}).get("time"),
+                "arrival": legs[-1].get("arrival_airport", {}).get("time"),
+                "stop_airports": [leg.get("arrival_airport", {}).get("id") for leg in legs[:-1]],
+                "flight_numbers": [leg.get("flight_number") for leg in legs],
+                "type": option.get("type"),
+            })
+        return cls(rows, price, duration, stops, airline, currency)
+
+    def filter(self, mask) -> "FareTable":
+        idx = np.flatnonzero(mask)
+        return FareTable(
+            [self.offers[i] for i in idx],
+            self.price[idx], self.duration_min[idx], self.stops[idx], self.airline[idx], self.currency,
+        )
+
+def price_distribution(table: FareTable, bins: int = 10) -> dict:
+    prices = table.price[~np.isnan(table.price)]
+    if prices.size == 0:
+        return {"count": 0}
+    p25, p50, p75, p90 = np.percentile(prices, [25, 50, 75, 90])
+    counts, edges = np.histogram(prices, bins=min(bins, max(int(np.unique(prices).size), 1)))
+    return {
+        "count": int(prices.size),
+        "min": float(prices.min()),
+        "max": float(prices.max()),
+        "mean": round(float(prices.mean()), 2),
+        "p25": float(p25),
+        "median": float(p50),
+        "p75": float(p75),
+        "p90": float(p90),
+        "histogram": [
+            {"from": round(float(lo), 2), "to": round(float(hi), 2), "count": int(c)}
+            for lo, hi, c in zip(edges[:-1], edges[1:], counts)
+        ],
+    }
+
+def cheapest_by_airline(table: FareTable) -> List[dict]:
+    if len(table) == 0:
+        return []
+    names, inverse = np.unique(table.airline.astype(str), return_inverse=True)
+    prices = np.where(np.isnan(table.price), np.inf, table.price)
+    min_price = np.full(names.size, np.inf)
+    np.minimum.at(min_price, inverse, prices)
+    counts = np.bincount(inverse, minlength=names.size)
+    order = np.argsort(min_price, kind="stable")
+    return [
+        {"airline": str(names[i]), "min_price": None if np.isinf(min_price[i]) else float(min_price[i]), "count": int(counts[i])}
+        for i in order
+    ]
+
+def stops_breakdown(table: FareTable) -> List[dict]:
+    if len(table) == 0:
+        return []
+    values, inverse = np.unique(table.stops, return_inverse=True)
+    prices = np.where(np.isnan(table.price), np.inf, table.price)
+    min_price = np.full(values.size, np.inf)
+    np.minimum.at(min_price, inverse, prices)
+    counts = np.bincount(inverse, minlength=values.size)
+    return [
+        {"num_stops": int(values[i]), "count": int(counts[i]), "min_price": None if np.isinf(min_price[i]) else float(min_price[i])}
+        for i in range(values.size)
+    ]
+
+def pareto_front(table: FareTable) -> List[dict]:
+    """Offers not beaten on both price and duration by any other offer, cheapest first."""
+    valid = np.flatnonzero(~np.isnan(table.price))
+    if valid.size == 0:
+        return []
+    order = valid[np.lexsort((table.duration_min[valid], table.price[valid]))]
+    durations = table.duration_min[order]
+    # Running minimum of duration among cheaper offers; a row is on the front if it strictly improves it
+    best_before = np.concatenate(([np.inf], np.minimum.accumulate(durations)[:-1]))
+    front = order[durations < best_before]
+    return [_row(table, i) for i in front]
+
+def _row(table: FareTable, i: int) -> dict:
+    return {
+        "price": float(table.price[i]),
+        "currency": table.currency,
+        "duration_min": int(table.duration_min[i]),
+        "num_stops": int(table.stops[i]),
+        "airline": str(table.airline[i]),
+        "offer": table.offers[i],
+    }
+
+def summarize(table: FareTable, max_stops: Optional[int] = None, airline: Optional[str] = None) -> dict:
+    mask = np.ones(len(table), dtype=bool)
+    if max_stops is not None:
+        mask &= table.stops <= max_stops
+    if airline:
+        mask &= np.char.lower(table.airline.astype(str)) == airline.lower()
+    table = table.filter(mask)
+    cheapest = None
+    if len(table) and not np.all(np.isnan(table.price)):
+        cheapest = _row(table, int(np.nanargmin(table.price)))
+    return {
+        "currency": table.currency,
+        "total_offers": len(table),
+        "cheapest": cheapest,
+        "price_distribution": price_distribution(table),
+        "cheapest_by_airline": cheapest_by_airline(table),
+        "stops": stops_breakdown(table),
+        "pareto_front": pareto_front(table),
+    }
+
+def remember_offers(roadmap_id: Optional[int], options: List[dict], currency: str):
+    """Keeps the raw SerpAPI options of the roadmap's latest ticket search for analyze_fares."""
+    if roadmap_id is None:
+        return
+    table = FareTable.from_serpapi(options, currency)
+    if len(table) == 0:
+        return
+    with _offers_lock:
+        _offers_by_roadmap[roadmap_id] = table
+        _offers_by_roadmap.move_to_end(roadmap_id)
+        while len(_offers_by_roadmap) > OFFERS_MAX_ROADMAPS:
+            _offers_by_roadmap.popitem(last=False)
+
+def get_fare_table(roadmap_id: Optional[int]) -> Optional[FareTable]:
+    """Offers from the roadmap's latest ticket search in this process, None if there was none."""
+    with _offers_lock:
+        table = _offers_by_roadmap.get(roadmap_id)
+        if table is not None:
+            _offers_by_roadmap.move_to_end(roadmap_id)
+    return table
+
+def analyze_fares(roadmap_id: Optional[int], max_stops: Optional[int] = None, airline: Optional[str] = None) -> Any:
+    print(f"[TOOL] analyze_fares called with: roadmap_id={roadmap_id}, max_stops={max_stops}, airline={airline}")
+    try:
+        table = get_fare_table(roadmap_id)
+        if table is None:
+            return NO_SEARCH_MESSAGE
+        return summarize(table, max_stops=max_stops, airline=airline)
+    except Exception as e:
+        return f"An error occurred while analyzing fares: {e}"
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+from tools.ticket_parser import search_flights, get_cached_flights
+from profiling import ProfilingExecutor
+import os
+
+FARE_CALENDAR_MAX_CONCURRENCY = int(os.environ.get("FARE_CALENDAR_MAX_CONCURRENCY", 4))
+FARE_CALENDAR_MAX_WINDOW_DAYS = 3
+# Paid API searches per call; cached date pairs are free and always included
+FARE_CALENDAR_MAX_SEARCHES = int(os.environ.get("FARE_CALENDAR_MAX_SEARCHES", 8))
+
+def _cheapest_price(results: dict) -> Optional[int]:
+    prices = []
+    for option in (results.get("best_flights") or []) + (results.get("other_flights") or []):
+        try:
+            prices.append(int(option.get("price")))
+        except (TypeError, ValueError):
+            continue
+    return min(prices) if prices else None
+
+def _days(day: str, origin) -> int:
+    return (datetime.strptime(day, "%Y-%m-%d").date() - origin).days
+
+def _search_pair(departure_id: str, destination_id: str, outbound: str, inbound: str) -> Optional[int]:
+    try:
+        return _cheapest_price(search_flights(departure_id, destination_id, outbound, inbound))
+    except Exception as e:
+        print(f"[TOOL] fare calendar search failed for {outbound} -> {inbound}: {e}")
+        return None
+
+def find_fare_calendar(
+    departure_id: str,
+    destination_id: str,
+    start_date: str,
+    end_date: str,
+    window_days: int = 3,
+    fixed_duration: bool = True,
+    top_n: int = 5,
+) -> Any:
+    """
+    Searches outbound dates start_date±window_days and return dates end_date±window_days concurrently
+    (at most FARE_CALENDAR_MAX_CONCURRENCY searches in flight) and returns a price matrix
+    plus the cheapest date combinations. With fixed_duration only pairs keeping the trip length are searched.
+    Cached pairs are read first; of the rest at most FARE_CALENDAR_MAX_SEARCHES, closest to the
+    requested dates, are searched and the others are reported as skipped.
+    """
+    print(f"[TOOL] find_fare_calendar called with: departure_id={departure_id}, destination_id={destination_id}, start_date={start_date}, end_date={end_date}, window_days={window_days}, fixed_duration={fixed_duration}")
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        window_days = max(0, min(int(window_days), FARE_CALENDAR_MAX_WINDOW_DAYS))
+        offsets = range(-window_days, window_days + 1)
+        outbound_dates = [start + timedelta(days=d) for d in offsets]
+        return_dates = [end + timedelta(days=d) for d in offsets]
+
+        pairs = []
+        for out in outbound_dates:
+            for ret in return_dates:
+                if ret < out:
+                    continue
+                if fixed_duration and ret - out != end - start:
+                    continue
+                pairs.append((out.isoformat(), ret.isoformat()))
+
+        price_by_pair = {}
+        misses = []
+        for pair in pairs:
+            cached = get_cached_flights(departure_id, destination_id, *pair)
+            if cached is not None:
+                price_by_pair[pair] = _cheapest_price(cached)
+            else:
+                misses.append(pair)
+        misses.sort(key=lambda pair: abs(_days(pair[0], start)) + abs(_days(pair[1], end)))
+        to_search, skipped = misses[:max(0, FARE_CALENDAR_MAX_SEARCHES)], misses[max(0, FARE_CALENDAR_MAX_SEARCHES):]
+        if to_search:
+            with ProfilingExecutor(max_workers=max(1, FARE_CALENDAR_MAX_CONCURRENCY)) as pool:
+                prices = list(pool.map(lambda pair: _search_pair(departure_id, destination_id, *pair), to_search))
+            price_by_pair.update(zip(to_search, prices))
+
+        return_columns = [d.isoformat() for d in return_dates]
+        matrix: List[dict] = []
+        for out in outbound_dates:
+            out_key = out.isoformat()
+            matrix.append({
+                "outbound_date": out_key,
+                "prices": [price_by_pair.get((out_key, ret)) for ret in return_columns],
+            })
+        priced = sorted(
+            ((price, out, ret) for (out, ret), price in price_by_pair.items() if price is not None),
+            key=lambda item: item[0],
+        )
+        return {
+            "departure_id": departure_id,
+            "destination_id": destination_id,
+            "return_dates": return_columns,
+            "matrix": matrix,
+            "cheapest": [
+                {"outbound_date": out, "return_date": ret, "price": price}
+                for price, out, ret in priced[:top_n]
+            ],
+            "searched_pairs": len(to_search),
+            "cached_pairs": len(pairs) - len(misses),
+            # Not searched to stay within FARE_CALENDAR_MAX_SEARCHES, a repeated call continues with them
+            "skipped_pairs": [{"outbound_date": out, "return_date": ret} for out, ret in skipped],
+        }
+    except Exception as e:
+        return f"An error occurred while building the fare calendar: {e}"
@@ -0,0 +1,167 @@
+import json
+import math
+import os
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+HOTELS_DATA_PATH = os.environ.get("HOTELS_DATA_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "hotels.json"))
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+GRID_CELL_DEG = 0.02  # roughly 2 km of latitude per cell
+
+_inventory = None
+
+def haversine_km(lat, lon, point_lat: float, point_lon: float):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat, lon, point_lat, point_lon))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+class HotelInventory:
+    """
+    In-memory hotel inventory loaded from a local dataset (hotels.json).
+    Keeps a uniform lat/lon grid for radius queries, a price-sorted index for budget cut-offs
+    and a rating-sorted index for ordering, so a search never scans or sorts the raw records.
+    """
+    def __init__(self, data: dict, cell_deg: float = GRID_CELL_DEG):
+        self.currency = data.get("currency", "KZT")
+        self.cell_deg = cell_deg
+        self.hotels: List[dict] = []
+        self.landmarks: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        city_ids: Dict[str, List[int]] = defaultdict(list)
+        for city in data.get("cities", []):
+            keys = [city["name"].lower()] + [alias.lower() for alias in city.get("aliases", [])]
+            for landmark in city.get("landmarks", []):
+                self.landmarks[(city["name"].lower(), landmark["name"].lower())] = (landmark["lat"], landmark["lon"])
+            for hotel in city.get("hotels", []):
+                hotel_id = len(self.hotels)
+                self.hotels.append(dict(hotel, city=city["name"]))
+                for key in keys:
+                    city_ids[key].append(hotel_id)
+        self.city_aliases = {key: self.hotels[ids[0]]["city"].lower() for key, ids in city_ids.items()}
+        self.city_ids = {key: np.asarray(ids, dtype=np.int64) for key, ids in city_ids.items()}
+
+        self.lat = np.asarray([h["lat"] for h in self.hotels], dtype=np.float64)
+        self.lon = np.asarray([h["lon"] for h in self.hotels], dtype=np.float64)
+        self.price = np.asarray([h["price_per_night"] for h in self.hotels], dtype=np.float64)
+        self.rating = np.asarray([h.get("rating", 0) for h in self.hotels], dtype=np.float64)
+        self.type = np.asarray([h.get("type", "").lower() for h in self.hotels], dtype=object)
+
+        self.price_order = np.argsort(self.price, kind="stable")
+        self.sorted_prices = self.price[self.price_order]
+        self.rating_order = np.lexsort((self.price, -self.rating))
+
+        grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for hotel_id in range(len(self.hotels)):
+            grid[self._cell(self.lat[hotel_id], self.lon[hotel_id])].append(hotel_id)
+        self.grid = {cell: np.asarray(ids, dtype=np.int64) for cell, ids in grid.items()}
+
+    @classmethod
+    def from_file(cls, path: str = HOTELS_DATA_PATH) -> "HotelInventory":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @property
+    def types(self):
+        return set(self.type)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def resolve_city(self, destination: str) -> Optional[str]:
+        return self.city_aliases.get((destination or "").strip().lower())
+
+    def city_landmarks(self, destination: str) -> List[str]:
+        city = self.resolve_city(destination)
+        return sorted(name for landmark_city, name in self.landmarks if landmark_city == city)
+
+    def resolve_places(self, destination: str, places: List[str]) -> Tuple[List[Tuple[str, float, float]], List[str]]:
+        """
+        Resolves landmark names of the destination, or raw "lat,lon" strings, to coordinates.
+        Returns the resolved points and the places that could not be resolved.
+        """
+        city = self.resolve_city(destination)
+        points, unresolved = [], []
+        for place in places or []:
+            try:
+                lat, lon = (float(x) for x in str(place).split(","))
+                points.append((str(place), lat, lon))
+                continue
+            except ValueError:
+                pass
+            coords = self.landmarks.get((city, str(place).strip().lower()))
+            if coords:
+                points.append((place, *coords))
+            else:
+                unresolved.append(place)
+        return points, unresolved
+
+    def nearest_distances(self, points: List[Tuple[str, float, float]], radius_km: float) -> np.ndarray:
+        """Distance in km from every hotel to the nearest point, inf for hotels outside radius_km of all points."""
+        distances = np.full(len(self.hotels), np.inf)
+        for _, lat, lon in points:
+            dlat = radius_km / KM_PER_DEGREE_LAT
+            dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+            lat_lo, lon_lo = self._cell(lat - dlat, lon - dlon)
+            lat_hi, lon_hi = self._cell(lat + dlat, lon + dlon)
+            cells = [
+                self.grid[(i, j)]
+                for i in range(lat_lo, lat_hi + 1)
+                for j in range(lon_lo, lon_hi + 1)
+                if (i, j) in self.grid
+            ]
+            if not cells:
+                continue
+            candidates = np.concatenate(cells)
+            d = haversine_km(self.lat[candidates], self.lon[candidates], lat, lon)
+            inside = d <= radius_km
+            np.minimum.at(distances, candidates[inside], d[inside])
+        return distances
+
+    def search(
+        self,
+        destination: str,
+        near: Optional[List[str]] = None,
+        radius_km: float = 3.0,
+        max_price_per_night: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        hotel_type: Optional[str] = None,
+        sort_by: str = "rating",
+        limit: int = 5,
+    ) -> List[dict]:
+        city = self.resolve_city(destination)
+        if city is None:
+            return []
+        mask = np.zeros(len(self.hotels), dtype=bool)
+        mask[self.city_ids[city]] = True
+        if max_price_per_night is not None:
+            mask[self.price_order[np.searchsorted(self.sorted_prices, max_price_per_night, side="right"):]] = False
+        if min_rating is not None:
+            mask &= self.rating >= min_rating
+        if hotel_type and hotel_type.lower() in self.types:
+            mask &= self.type == hotel_type.lower()
+        distances = None
+        if near:
+            # Only resolved places constrain the search; with none left there is nothing "near" to match
+            points, _ = self.resolve_places(destination, near)
+            if not points:
+                return []
+            distances = self.nearest_distances(points, radius_km)
+            mask &= np.isfinite(distances)
+        order = self.price_order if sort_by == "price" else self.rating_order
+        ranked = order[mask[order]][:limit]
+        results = []
+        for hotel_id in ranked:
+            hotel = dict(self.hotels[hotel_id])
+            if distances is not None:
+                hotel["distance_km"] = round(float(distances[hotel_id]), 2)
+            hotel["currency"] = self.currency
+            results.append(hotel)
+        return results
+
+def get_inventory() -> HotelInventory:
+    global _inventory
+    if _inventory is None:
+        _inventory = HotelInventory.from_file()
+    return _inventory
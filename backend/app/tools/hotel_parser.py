@@ -1,30 +1,72 @@
 from sqlalchemy.orm import Session
 from schemas.models import AccommodationInDB
 from datetime import datetime
+from typing import Any, List, Optional
+from tools.hotel_inventory import get_inventory
 
-def find_hotels(db: Session, roadmap_id: int, destination: str, check_in_date: str, check_out_date: str, preference: str) -> str:
+BUDGET_PREFERENCES = {"budget", "cheap", "cheapest", "economy"}
+
+def find_hotels(
+    db: Session,
+    roadmap_id: int,
+    destination: str,
+    check_in_date: str,
+    check_out_date: str,
+    preference: str,
+    near_places: Optional[List[str]] = None,
+    radius_km: float = 3.0,
+    max_price_per_night: Optional[int] = None,
+) -> Any:
     """
-    Finds a hotel based on user preference and saves it to the database.
-    This is a mock tool.
+    Finds hotels in the local inventory near the given places and under budget,
+    saves the best match to the database and returns it together with the alternatives.
+    preference is a hotel type (luxury, boutique, standard, hostel, apartment, resort) or "budget".
     """
-    print(f"[TOOL] find_hotels called with: roadmap_id={roadmap_id}, destination={destination}, check_in_date={check_in_date}, check_out_date={check_out_date}, preference={preference}")
+    print(f"[TOOL] find_hotels called with: roadmap_id={roadmap_id}, destination={destination}, check_in_date={check_in_date}, check_out_date={check_out_date}, preference={preference}, near_places={near_places}, radius_km={radius_km}, max_price_per_night={max_price_per_night}")
     try:
-        hotel_name = f"{preference.capitalize()} Hotel in {destination}"
-        
+        check_in = datetime.strptime(check_in_date, "%Y-%m-%d")
+        check_out = datetime.strptime(check_out_date, "%Y-%m-%d")
+        nights = max((check_out - check_in).days, 1)
+
+        inventory = get_inventory()
+        _, unresolved = inventory.resolve_places(destination, near_places)
+        if unresolved:
+            known = ", ".join(inventory.city_landmarks(destination)) or "none"
+            return (
+                f"Could not locate {', '.join(map(str, unresolved))} in {destination}, nothing was saved. "
+                f"Known landmarks: {known}. Use one of them or \"lat,lon\" coordinates."
+            )
+
+        preference = (preference or "").strip().lower()
+        hotels = inventory.search(
+            destination,
+            near=near_places,
+            radius_km=radius_km,
+            max_price_per_night=max_price_per_night,
+            hotel_type=preference,
+            sort_by="price" if preference in BUDGET_PREFERENCES else "rating",
+        )
+        if not hotels:
+            return f"No hotels found in {destination} matching your criteria."
+
+        best = hotels[0]
         hotel = AccommodationInDB(
             roadmap_id=roadmap_id,
-            name=hotel_name,
-            check_in=datetime.strptime(check_in_date, "%Y-%m-%d"),
-            check_out=datetime.strptime(check_out_date, "%Y-%m-%d"),
-            price_total=500,
-            location=destination,
-            provider_url="https://example.com/hotel"
+            name=best["name"],
+            check_in=check_in,
+            check_out=check_out,
+            price_total=int(best["price_per_night"] * nights),
+            location=f"{best['address']}, {best['city']}",
+            provider_url=best["url"]
         )
 
         db.add(hotel)
         db.commit()
-        
-        return f"Found and saved a '{preference}' hotel in {destination}."
+
+        return {
+            "saved": dict(best, nights=nights, price_total=hotel.price_total),
+            "alternatives": hotels[1:],
+        }
     except Exception as e:
         db.rollback()
-        return f"An error occurred while finding hotels: {e}" 
\ No newline at end of file
+        return f"An error occurred while finding hotels: {e}"
@@ -1,8 +1,81 @@
 from sqlalchemy.orm import Session
 from schemas.models import Ticket, RoadmapInDB
 from datetime import datetime, date
+from typing import Optional
+from tools.fare_analytics import remember_offers
+import serpapi
+from collections import OrderedDict
+import threading
+import time
 import os
 
+SEARCH_CACHE_TTL_SECONDS = int(os.environ.get("FLIGHT_SEARCH_CACHE_TTL_SECONDS", 1800))
+SEARCH_CACHE_MAX_ENTRIES = 512
+# Per HTTP request (connect and each read), so a stuck search cannot outlive the chat turn deadline
+SEARCH_TIMEOUT_SECONDS = float(os.environ.get("FLIGHT_SEARCH_TIMEOUT_SECONDS", 20))
+
+# (departure_id, destination_id, start_date, end_date) -> (stored_at, results)
+_search_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_search_cache_lock = threading.Lock()
+# requests.Session is not thread-safe, fare calendar threads each get their own client
+_clients = threading.local()
+
+class _TimeoutClient(serpapi.Client):
+    """serpapi 0.1.5 has no timeout option, inject one into every request it makes."""
+    def request(self, method, path, params, **kwargs):
+        kwargs.setdefault("timeout", SEARCH_TIMEOUT_SECONDS)
+        return super().request(method, path, params, **kwargs)
+
+def _client() -> serpapi.Client:
+    if not hasattr(_clients, "client"):
+        _clients.client = _TimeoutClient()
+    return _clients.client
+
+def get_cached_flights(departure_id: str, destination_id: str, start_date: str, end_date: str) -> Optional[dict]:
+    """Cached results of search_flights for the date pair, None if there are none or they expired."""
+    key = (departure_id.upper(), destination_id.upper(), start_date, end_date)
+    with _search_cache_lock:
+        cached = _search_cache.get(key)
+        if cached and time.monotonic() - cached[0] < SEARCH_CACHE_TTL_SECONDS:
+            _search_cache.move_to_end(key)
+            return cached[1]
+    return None
+
+def search_flights(departure_id: str, destination_id: str, start_date: str, end_date: str) -> dict:
+    """
+    Runs a Google Flights search for one date pair. Successful results are cached per date pair
+    for SEARCH_CACHE_TTL_SECONDS so repeated and calendar searches do not hit the paid API again.
+    """
+    cached = get_cached_flights(departure_id, destination_id, start_date, end_date)
+    if cached is not None:
+        return cached
+
+    key = (departure_id.upper(), destination_id.upper(), start_date, end_date)
+    now = time.monotonic()
+
+    params = {
+        "engine": "google_flights",
+        "departure_id": departure_id,
+        "arrival_id": destination_id,
+        "outbound_date": start_date,
+        "return_date": end_date,
+        "currency": "KZT",
+        "hl": "en",
+        "api_key": os.environ.get("SERPAPI_API_KEY")
+    }
+    results = dict(_client().search(params))
+    if "error" not in results:
+        with _search_cache_lock:
+            _search_cache[key] = (now, results)
+            _search_cache.move_to_end(key)
+            while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+                _search_cache.popitem(last=False)
+    return results
+
+def _stop_airports(option: dict) -> list:
+    # Every leg but the last lands at a stop
+    return [leg['arrival_airport']['id'] for leg in (option.get('flights') or [])[:-1]]
+
 def find_tickets(db: Session, roadmap_id: int, departure_id: str, destination_id: str, start_date: str, end_date: str) -> str:
     """
     Finds flight tickets for the given departure and destination and dates and saves them to the database.
@@ -12,20 +85,10 @@ def find_tickets(db: Session, roadmap_id: int, departure_id: str, destination_id
     """
     print(f"[TOOL] find_tickets called with: roadmap_id={roadmap_id}, departure_id={departure_id}, destination_id={destination_id}, start_date={start_date}, end_date={end_date}")
     try:
-        params = {
-            "engine": "google_flights",
-            "departure_id": departure_id,
-            "arrival_id": destination_id,
-            "outbound_date": start_date,
-            "return_date": end_date,
-            "currency": "KZT",
-            "hl": "en",
-            "api_key": os.environ.get("SERPAPI_API_KEY")
-        }
-
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = search_flights(departure_id, destination_id, start_date, end_date)
         print(results)
+        currency = results.get('search_parameters', {}).get('currency', 'Unknown')
+        remember_offers(roadmap_id, (results.get('best_flights') or []) + (results.get('other_flights') or []), currency)
 
         flights_list = results.get('best_flights') or results.get('other_flights') or []
         flights_list = flights_list[:20]  # get more to allow pairing
@@ -88,8 +151,8 @@ def find_tickets(db: Session, roadmap_id: int, departure_id: str, destination_id
                         "currency": results.get('search_parameters', {}).get('currency', 'Unknown'),
                         "type": out_opt.get('type', 'Unknown'),
                         "buy_url": out_opt.get('link') or ret_opt.get('link') or "Not available",
-                        "num_stops": 0,  # single segment each way
-                        "stop_airports": []
+                        "num_stops": len(_stop_airports(out_opt)) + len(_stop_airports(ret_opt)),
+                        "stop_airports": _stop_airports(out_opt) + _stop_airports(ret_opt)
                     })
         # If no pairs found, fallback to original logic (single direction per option)
         if paired:
@@ -136,8 +199,8 @@ def find_tickets(db: Session, roadmap_id: int, departure_id: str, destination_id
                     "currency": results.get('search_parameters', {}).get('currency', 'Unknown'),
                     "type": option.get('type', 'Unknown'),
                     "buy_url": option.get('link') or "Not available",
-                    "num_stops": 0,
-                    "stop_airports": []
+                    "num_stops": len(_stop_airports(option)),
+                    "stop_airports": _stop_airports(option)
                 })
         print(structured_flights)
         return structured_flights
@@ -0,0 +1,14 @@
+"""
+Applies the slow schema upgrades (config.MAINTENANCE_UPGRADES) to the database in POSTGRES_URL.
+
+    python upgrade_db.py
+
+Adding chat_messages.content_tsv rewrites the whole table and blocks reads and writes on it
+until done, so run this in a maintenance window. Every statement is idempotent. If an index
+build is interrupted, drop the INVALID index it leaves behind and run the script again.
+"""
+from config import init_db, run_maintenance_upgrades
+
+if __name__ == "__main__":
+    init_db()
+    run_maintenance_upgrades()
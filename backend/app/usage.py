@@ -0,0 +1,169 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, date
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from config import SessionLocal
+from schemas.models import TokenUsage, UserInDB
+
+DAILY_TOKEN_BUDGET = int(os.environ.get("DAILY_TOKEN_BUDGET", 200000))
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.environ.get("USAGE_FLUSH_INTERVAL_SECONDS", 10))
+USAGE_FLUSH_MAX_PENDING = int(os.environ.get("USAGE_FLUSH_MAX_PENDING", 100))
+# Rough prompt size estimate used to reject oversized messages before the LLM is called
+CHARS_PER_TOKEN = 4
+
+class TokenBudgetExceeded(Exception):
+    def __init__(self, used: int, budget: int):
+        self.used = used
+        self.budget = budget
+        super().__init__(f"Daily token budget exceeded: {used} of {budget} tokens used today")
+
+class UsageRecorder:
+    """
+    Aggregates token usage per (user, conversation, day) in memory and upserts it into token_usage
+    in batches, every USAGE_FLUSH_INTERVAL_SECONDS or USAGE_FLUSH_MAX_PENDING turns.
+    Also keeps each user's running total for today so budget checks do not hit the DB on every turn.
+    Batches being written stay visible to used_today until their upsert has committed.
+    """
+    def __init__(self, flush_interval: float = USAGE_FLUSH_INTERVAL_SECONDS, max_pending: int = USAGE_FLUSH_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[int, uuid.UUID, date], list] = {}
+        self._pending_turns = 0
+        self._in_flight: List[Dict[Tuple[int, uuid.UUID, date], list]] = []
+        self._flush_epoch = 0
+        self._today: Dict[int, int] = {}
+        self._today_day = datetime.utcnow().date()
+        self._last_flush = time.monotonic()
+        self._flushing = False
+        self._lock = threading.Lock()
+
+    def _roll_day(self) -> date:
+        today = datetime.utcnow().date()
+        if today != self._today_day:
+            self._today_day = today
+            self._today = {}
+        return today
+
+    def budget_for(self, user: UserInDB) -> Optional[int]:
+        budget = user.daily_token_budget if user.daily_token_budget is not None else DAILY_TOKEN_BUDGET
+        return budget or None
+
+    def _unflushed_tokens(self, user_id: int, today: date) -> int:
+        return sum(
+            totals[0] + totals[1]
+            for batch in [self._pending] + self._in_flight
+            for (uid, _, day), totals in batch.items()
+            if uid == user_id and day == today
+        )
+
+    def used_today(self, db: Session, user_id: int) -> int:
+        while True:
+            with self._lock:
+                today = self._roll_day()
+                if user_id in self._today:
+                    return self._today[user_id]
+                epoch = self._flush_epoch
+                writing = bool(self._in_flight)
+            used = db.query(
+                func.coalesce(func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens), 0)
+            ).filter(TokenUsage.user_id == user_id, TokenUsage.day == today).scalar()
+            with self._lock:
+                if self._flush_epoch != epoch:
+                    # A batch left _in_flight during the read, it may or may not be in `used`
+                    continue
+                total = int(used) + self._unflushed_tokens(user_id, today)
+                # Only cache a total read while nothing was being written, otherwise it may double count
+                if not writing and not self._in_flight:
+                    self._today[user_id] = total
+                return total
+
+    def check_budget(self, db: Session, user_id: int, budget: Optional[int], incoming_text: str = ""):
+        # Takes plain values so long-lived callers (the WebSocket) don't hold on to an ORM user
+        if budget is None:
+            return
+        used = self.used_today(db, user_id)
+        if used + len(incoming_text) // CHARS_PER_TOKEN > budget:
+            raise TokenBudgetExceeded(used, budget)
+
+    def record(self, user_id: int, conversation_id: Optional[uuid.UUID], usage: Optional[dict]):
+        if not usage:
+            return
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        with self._lock:
+            today = self._roll_day()
+            totals = self._pending.setdefault((user_id, conversation_id, today), [0, 0, 0])
+            totals[0] += prompt_tokens
+            totals[1] += completion_tokens
+            totals[2] += 1
+            self._pending_turns += 1
+            if user_id in self._today:
+                self._today[user_id] += prompt_tokens + completion_tokens
+            due = self._pending_turns >= self.max_pending or time.monotonic() - self._last_flush >= self.flush_interval
+            if due and not self._flushing:
+                self._flushing = True
+            else:
+                due = False
+        if due:
+            asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._pending_turns = 0
+            self._last_flush = time.monotonic()
+            if batch:
+                self._in_flight.append(batch)
+        failed = False
+        try:
+            if not batch:
+                return
+            stmt = insert(TokenUsage).values([
+                {
+                    "user_id": user_id,
+                    "conversation_id": conversation_id,
+                    "day": day,
+                    "prompt_tokens": totals[0],
+                    "completion_tokens": totals[1],
+                    "requests": totals[2],
+                    "updated_at": datetime.utcnow(),
+                }
+                for (user_id, conversation_id, day), totals in batch.items()
+            ])
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_token_usage_user_conversation_day",
+                set_={
+                    "prompt_tokens": TokenUsage.prompt_tokens + stmt.excluded.prompt_tokens,
+                    "completion_tokens": TokenUsage.completion_tokens + stmt.excluded.completion_tokens,
+                    "requests": TokenUsage.requests + stmt.excluded.requests,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+            db = SessionLocal()
+            try:
+                db.execute(stmt)
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"[USAGE] failed to flush {len(batch)} usage rows, keeping them for the next flush: {e}")
+            failed = True
+        finally:
+            with self._lock:
+                if batch:
+                    if failed:
+                        for key, totals in batch.items():
+                            merged = self._pending.setdefault(key, [0, 0, 0])
+                            for i in range(3):
+                                merged[i] += totals[i]
+                    self._in_flight = [b for b in self._in_flight if b is not batch]
+                    self._flush_epoch += 1
+                self._flushing = False
+
+usage_recorder = UsageRecorder()